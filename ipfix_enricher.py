@@ -15,12 +15,19 @@ import gc
 import threading
 import errno
 import select
+import array
+import re
+import ctypes
+import ctypes.util
 import logging
 from logging.handlers import RotatingFileHandler
 from datetime import datetime
-from collections import deque
 
-# Setup logging before anything else
+# Module logger; handlers are attached by setup_logging() when the service
+# starts, so importing the module has no side effects. The name is kept as
+# 'ipfix-enricher' since it appears in every log line
+logger = logging.getLogger('ipfix-enricher')
+
 def setup_logging():
     """Configure logging with file rotation"""
     # Create log directory
@@ -58,39 +65,282 @@ def setup_logging():
     
     return logger
 
-# Initialize logger
-logger = setup_logging()
+# IPFIX (RFC 7011) message layout
+IPFIX_VERSION = 10
+IPFIX_HEADER_LEN = 16
+IPFIX_TEMPLATE_SET_ID = 2
+IPFIX_MIN_DATA_SET_ID = 256
+IPFIX_VARIABLE_LENGTH = 65535
+IPFIX_ENTERPRISE_BIT = 0x8000
+
+# Information Elements rewritten by the enricher:
+# bgpSourceAsNumber (16) and bgpDestinationAsNumber (17)
+IPFIX_AS_FIELD_IDS = (16, 17)
+
+# Address Information Elements a record is matched on: sourceIPv4Address
+# (8), destinationIPv4Address (12), sourceIPv6Address (27) and
+# destinationIPv6Address (28)
+IPFIX_IPV4_FIELD_IDS = (8, 12)
+IPFIX_IPV6_FIELD_IDS = (27, 28)
+
+# Batched datagram I/O (Linux recvmmsg/sendmmsg)
+MMSG_BATCH = 64
+MMSG_BUFFER_SIZE = 65535
+MSG_WAITFORONE = 0x10000
+RECV_WAIT_TIMEOUT_US = 10000
+
+# Socket buffer sizes to try, largest first. The *BUFFORCE variants
+# (Linux, CAP_NET_ADMIN) are not capped by net.core.rmem_max/wmem_max
+SOCKET_BUFFER_SIZES = [134217728, 67108864, 33554432, 16777216]
+SO_SNDBUFFORCE = getattr(socket, 'SO_SNDBUFFORCE', 32)
+SO_RCVBUFFORCE = getattr(socket, 'SO_RCVBUFFORCE', 33)
+
+# iovecs shared by one sendmmsg call: enriched packets are sent as
+# gathered slices of the received datagram plus the target AS bytes
+MMSG_IOV_POOL = 4096
+
+# Non-IPFIX fallback: count AS 0 replacements on one packet in N and
+# scale, instead of scanning every packet twice
+FALLBACK_COUNT_SAMPLE = 16
+
+# Packets kept for retry after EAGAIN; beyond this the oldest are dropped
+SEND_RETRY_LIMIT = 1000
+
+# Packet size histogram: 100-byte buckets, the last one is open-ended
+SIZE_HIST_BUCKETS = 16
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.c_void_p),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', _MsgHdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+def _load_libc():
+    """Load libc with recvmmsg/sendmmsg bindings, or None if unavailable"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        recvmmsg = libc.recvmmsg
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+        
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint,
+                         ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return libc
 
-# Log startup
-logger.info("="*60)
-logger.info("IPFIX AS Enricher v5.1 starting...")
-logger.info("="*60)
+libc = _load_libc()
+
+class MMsgReceiver:
+    """Receive up to MMSG_BATCH datagrams per syscall with recvmmsg"""
+    def __init__(self, sock, batch=MMSG_BATCH, buffer_size=MMSG_BUFFER_SIZE):
+        self.fd = sock.fileno()
+        self.batch = batch
+        
+        # Buffers are allocated once and reused for every call
+        self.buffers = [ctypes.create_string_buffer(buffer_size) for _ in range(batch)]
+        self.addresses = [ctypes.addressof(buf) for buf in self.buffers]
+        self.iovecs = (_IOVec * batch)()
+        self.msgs = (_MMsgHdr * batch)()
+        
+        # struct sockaddr_in per slot, filled in with each sender's address
+        self.names = [ctypes.create_string_buffer(16) for _ in range(batch)]
+        self.name_addresses = [ctypes.addressof(name) for name in self.names]
+        
+        # Raw port + address bytes -> (ip, port), as recvfrom returns it
+        self.exporters = {}
+        
+        for i in range(batch):
+            self.iovecs[i].iov_base = self.addresses[i]
+            self.iovecs[i].iov_len = buffer_size
+            self.msgs[i].msg_hdr.msg_iov = ctypes.addressof(self.iovecs[i])
+            self.msgs[i].msg_hdr.msg_iovlen = 1
+            self.msgs[i].msg_hdr.msg_name = self.name_addresses[i]
+            self.msgs[i].msg_hdr.msg_namelen = 16
+            
+    def _exporter(self, i):
+        """Sender address of slot i as an (ip, port) tuple"""
+        raw = ctypes.string_at(self.name_addresses[i] + 2, 6)
+        exporter = self.exporters.get(raw)
+        if exporter is None:
+            exporter = (socket.inet_ntoa(raw[2:]), struct.unpack('!H', raw[:2])[0])
+            self.exporters[raw] = exporter
+        return exporter
+        
+    def recv(self, max_items, wait=False):
+        """Return pending (data, exporter) datagrams (empty list if none)
+        
+        With wait=True the call blocks until the first datagram arrives or
+        the socket's SO_RCVTIMEO expires, then returns whatever is queued.
+        The socket is AF_INET only, so the kernel always writes back a
+        16-byte msg_namelen and the slots need no reset between calls.
+        """
+        flags = MSG_WAITFORONE if wait else socket.MSG_DONTWAIT
+        count = libc.recvmmsg(self.fd, self.msgs, min(max_items, self.batch), flags, None)
+        if count < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            raise OSError(err, os.strerror(err))
+            
+        msgs = self.msgs
+        addresses = self.addresses
+        exporter = self._exporter
+        return [(ctypes.string_at(addresses[i], msgs[i].msg_len), exporter(i)) for i in range(count)]
+
+class MMsgSender:
+    """Send up to MMSG_BATCH datagrams per syscall with sendmmsg"""
+    def __init__(self, sock, destination, patch, batch=MMSG_BATCH, iov_pool=MMSG_IOV_POOL):
+        self.fd = sock.fileno()
+        self.batch = batch
+        
+        # struct sockaddr_in for the fixed destination
+        self.sockaddr = ctypes.create_string_buffer(
+            struct.pack('=H', socket.AF_INET) + struct.pack('!H', destination[1]) +
+            socket.inet_aton(destination[0]) + b'\x00' * 8)
+        self.msgs = (_MMsgHdr * batch)()
+        
+        # Bytes written over each patched position (kept referenced)
+        self.patch = patch
+        self.patch_addr = ctypes.cast(patch, ctypes.c_void_p).value
+        self.patch_len = len(patch)
+        
+        # Each message takes a run of iovecs from the shared pool
+        self.iov_pool = iov_pool
+        self.iovecs = (_IOVec * iov_pool)()
+        self.iov_addr = ctypes.addressof(self.iovecs)
+        self.iov_size = ctypes.sizeof(_IOVec)
+        
+        for i in range(batch):
+            self.msgs[i].msg_hdr.msg_name = ctypes.addressof(self.sockaddr)
+            self.msgs[i].msg_hdr.msg_namelen = 16
+            
+    def send(self, packets):
+        """Send (data, positions) packets in order; return (packets_sent, bytes_sent)
+        
+        Each datagram is gathered from slices of data with the patch bytes
+        in place of the 4 bytes at every position. Sending stops at the
+        first packet the kernel rejects or that no longer fits the iovec
+        pool; the caller handles the remainder. The packets list must stay
+        referenced for the duration of the call since the iovecs point into
+        the bytes objects.
+        """
+        count = min(len(packets), self.batch)
+        iovecs = self.iovecs
+        msgs = self.msgs
+        patch_addr = self.patch_addr
+        patch_len = self.patch_len
+        n = 0
+        
+        for i in range(count):
+            data, positions = packets[i]
+            if n + 2 * len(positions) + 1 > self.iov_pool:
+                count = i
+                break
+                
+            base = ctypes.cast(data, ctypes.c_void_p).value
+            first = n
+            last = 0
+            for pos in positions:
+                if pos > last:
+                    iovecs[n].iov_base = base + last
+                    iovecs[n].iov_len = pos - last
+                    n += 1
+                iovecs[n].iov_base = patch_addr
+                iovecs[n].iov_len = patch_len
+                n += 1
+                last = pos + patch_len
+                
+            if last < len(data) or n == first:
+                iovecs[n].iov_base = base + last
+                iovecs[n].iov_len = len(data) - last
+                n += 1
+                
+            hdr = msgs[i].msg_hdr
+            hdr.msg_iov = self.iov_addr + first * self.iov_size
+            hdr.msg_iovlen = n - first
+            
+        if count == 0:
+            return 0, 0
+            
+        sent = libc.sendmmsg(self.fd, msgs, count, 0)
+        if sent <= 0:
+            return 0, 0
+            
+        msgs = self.msgs
+        return sent, sum(msgs[i].msg_len for i in range(sent))
 
 class CircularBuffer:
-    """Thread-safe circular buffer for traffic spikes"""
+    """Lock-free single-producer/single-consumer ring for traffic spikes
+    
+    Exactly one thread may call put() and one other thread get_batch().
+    head is only advanced by the producer and tail only by the consumer;
+    under the GIL each slot store and index update is atomic, so no lock
+    is needed.
+    """
     def __init__(self, size=10000):
-        self.buffer = deque(maxlen=size)
-        self.lock = threading.Lock()
+        capacity = 1
+        while capacity < size:
+            capacity <<= 1
+            
+        self.maxlen = size
+        self.mask = capacity - 1
+        self.slots = [None] * capacity
+        self.head = 0
+        self.tail = 0
         self.dropped = 0
         
     def put(self, item):
-        with self.lock:
-            if len(self.buffer) >= self.buffer.maxlen:
-                self.dropped += 1
-                return False
-            self.buffer.append(item)
-            return True
-            
+        head = self.head
+        if head - self.tail >= self.maxlen:
+            self.dropped += 1
+            return False
+        self.slots[head & self.mask] = item
+        self.head = head + 1
+        return True
+        
     def get_batch(self, max_items=100):
-        items = []
-        with self.lock:
-            while self.buffer and len(items) < max_items:
-                items.append(self.buffer.popleft())
+        tail = self.tail
+        count = min(max_items, self.head - tail)
+        if count <= 0:
+            return []
+            
+        slots = self.slots
+        start = tail & self.mask
+        end = start + count
+        if end <= len(slots):
+            items = slots[start:end]
+            slots[start:end] = [None] * count
+        else:
+            end -= len(slots)
+            items = slots[start:] + slots[:end]
+            slots[start:] = [None] * (len(slots) - start)
+            slots[:end] = [None] * end
+            
+        self.tail = tail + count
         return items
         
     def size(self):
-        with self.lock:
-            return len(self.buffer)
+        return self.head - self.tail
 
 class IPFIXEnricher:
     def __init__(self):
@@ -112,14 +362,35 @@ class IPFIXEnricher:
             struct.pack('BBB', 185, 54, 83),
         ]
         
+        # Single-pass matcher for all IPv4 prefixes (sre factors the shared
+        # 185.54 prefix into a literal search followed by a charset check)
+        self._ipv4_prefix_re = re.compile(b'|'.join(re.escape(p) for p in self.ipv4_prefixes))
+        
         self.ipv6_prefix = bytes.fromhex('2a024460')
         
+        # Both families in one set for the per-record address check (the
+        # prefixes differ in length, so they cannot be confused)
+        self._address_prefixes = frozenset(self.ipv4_prefixes) | {self.ipv6_prefix}
+        
         # AS numbers in network byte order
         self.as_target = struct.pack('!I', self.target_as)
         self.as_zero = struct.pack('!I', 0)
         
-        # Buffer for traffic spikes
-        self.send_buffer = CircularBuffer(size=20000)
+        # IPFIX templates: (exporter, observation_domain, template_id) ->
+        # (record_len, as_offsets, address_fields). Templates are scoped to the transport
+        # session (RFC 7011), and exporters commonly share domain 0 and
+        # template id 256, so the exporter address is part of the key
+        self._templates = {}
+        
+        # Receive threads, one SO_REUSEPORT socket each (the kernel spreads
+        # exporters across the sockets by flow hash)
+        self.rx_threads = min(4, os.cpu_count() or 1)
+        self.cpu_affinity = True
+        
+        # Buffers for traffic spikes, one per receive thread so that every
+        # ring keeps a single producer
+        self.send_buffer_size = 20000
+        self.send_buffers = []
         
         # Thread-safe statistics
         self.stats = {
@@ -140,30 +411,50 @@ class IPFIXEnricher:
             'error_types': {},
             'last_packet_time': 0,
             'max_packet_seen': 0,
-            'size_distribution': {},
             'debug_packets_shown': 0,
         }
         self.stats_lock = threading.Lock()
         
+        # Packet size histograms, one per receive thread (summed when printed)
+        self._size_hists = []
+        
+        # Debug counters, only touched by the receive threads (approximate,
+        # no lock needed)
+        self._debug_shown = 0
+        self._debug_enriched_shown = 0
+        self._fallback_seen = 0
+        
+        # Peak send buffer size, sampled once per batch and merged into the
+        # statistics when they are printed
+        self._buffer_max_local = 0
+        
         # Timing
         self.start_time = time.time()
-        self.last_stats_time = time.time()
-        self.last_gc_time = time.time()
+        self.last_stats_ns = time.monotonic_ns()
+        self.last_gc_ns = time.monotonic_ns()
         self.last_debug_time = time.time()
         
         # Control flags
         self.running = True
         self.sender_thread = None
+        self.receiver_threads = []
         self.debug_mode = True
         self.max_debug_packets = 10
         
         # Sockets
-        self.recv_sock = None
+        self.recv_socks = []
         self.send_sock = None
+        self.mmsg_sender = None
         
         # Performance counters
         self.packets_since_stats = 0
         
+        # /proc/self/status kept open, re-read with pread() for each report
+        try:
+            self._status_fd = os.open('/proc/self/status', os.O_RDONLY)
+        except OSError:
+            self._status_fd = None
+        
         # Signal handlers
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -176,11 +467,12 @@ class IPFIXEnricher:
     def _optimize_system(self):
         """Optimize system settings"""
         optimizations = [
-            ('/proc/sys/net/core/wmem_max', '16777216'),
-            ('/proc/sys/net/core/rmem_max', '16777216'),
+            ('/proc/sys/net/core/wmem_max', '134217728'),
+            ('/proc/sys/net/core/rmem_max', '134217728'),
             ('/proc/sys/net/core/wmem_default', '4194304'),
             ('/proc/sys/net/core/rmem_default', '4194304'),
             ('/proc/sys/net/core/netdev_max_backlog', '10000'),
+            ('/proc/sys/net/core/netdev_budget', '600'),
             ('/proc/sys/net/ipv4/udp_mem', '102400 873800 16777216'),
         ]
         
@@ -225,38 +517,79 @@ class IPFIXEnricher:
         logger.info(f"Path MTU discovered: {self.discovered_mtu} bytes")
         logger.info(f"Using max packet size: {self.max_packet_size} bytes")
         
+    def _set_socket_buffer(self, sock, option, force_option):
+        """Set the largest socket buffer the kernel accepts
+        
+        The FORCE option is tried first for each size; without CAP_NET_ADMIN
+        it fails and the regular option (capped at rmem_max/wmem_max) is used.
+        """
+        for size in SOCKET_BUFFER_SIZES:
+            for opt in (force_option, option):
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, opt, size)
+                except OSError:
+                    continue
+                    
+                actual = sock.getsockopt(socket.SOL_SOCKET, option)
+                name = 'SO_RCVBUF' if option == socket.SO_RCVBUF else 'SO_SNDBUF'
+                logger.info(f"{name}: requested {size} bytes, kernel reports {actual} bytes")
+                return actual
+                
+        return None
+        
+    def _create_recv_socket(self):
+        """Create one receive socket bound to the listen port"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            
+        # Large receive buffer
+        self._set_socket_buffer(sock, socket.SO_RCVBUF, SO_RCVBUFFORCE)
+        
+        sock.bind(('0.0.0.0', self.listen_port))
+        sock.setblocking(False)
+        
+        # Block inside recvmmsg itself instead of a separate select()
+        if libc is not None:
+            sock.setblocking(True)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO,
+                            struct.pack('@ll', 0, RECV_WAIT_TIMEOUT_US))
+            
+        return sock
+        
     def _setup_sockets(self):
         """Setup sockets with optimizations"""
         try:
             self._optimize_system()
             
-            # Receive socket
-            self.recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.recv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            
-            # Large receive buffer
-            for size in [16777216, 8388608, 4194304, 2097152]:
-                try:
-                    self.recv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
-                    break
-                except:
-                    continue
-                    
-            self.recv_sock.bind(('0.0.0.0', self.listen_port))
-            self.recv_sock.setblocking(False)
+            # Receive sockets, all bound to the same port
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                self.rx_threads = 1
+                
+            for _ in range(self.rx_threads):
+                self.recv_socks.append(self._create_recv_socket())
+                
+            logger.info(f"Receive threads: {self.rx_threads} (SO_REUSEPORT)")
             
+            # Batch receive with recvmmsg where available
+            if libc is not None:
+                logger.info(f"recvmmsg batching enabled ({MMSG_BATCH} packets/syscall)")
+            else:
+                logger.info("recvmmsg unavailable, using recvfrom")
+                
             # Send socket
             self.send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.send_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             
             # Large send buffer
-            for size in [16777216, 8388608, 4194304, 2097152]:
-                try:
-                    self.send_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
-                    break
-                except:
-                    continue
-                    
+            self._set_socket_buffer(self.send_sock, socket.SO_SNDBUF, SO_SNDBUFFORCE)
+            
+            # Batch send with sendmmsg where available
+            if libc is not None:
+                self.mmsg_sender = MMsgSender(self.send_sock, self.destination, self.as_target)
+                logger.info(f"sendmmsg batching enabled ({MMSG_BATCH} packets/syscall)")
+                
             # Try to enable path MTU discovery
             try:
                 if hasattr(socket, 'IP_MTU_DISCOVER') and hasattr(socket, 'IP_PMTUDISC_DO'):
@@ -281,139 +614,327 @@ class IPFIXEnricher:
             
     def _cleanup_sockets(self):
         """Clean socket shutdown"""
-        for sock in [self.recv_sock, self.send_sock]:
+        for sock in self.recv_socks + [self.send_sock]:
             if sock:
                 try:
                     sock.close()
                 except:
                     pass
                     
-    def _check_patterns(self, data):
-        """Check IP patterns with improved detection"""
+        if self._status_fd is not None:
+            os.close(self._status_fd)
+            self._status_fd = None
+            
+    def _check_patterns(self, data, debug=False):
+        """Check IP patterns with direct bytes search
+        
+        debug is the caller's per-batch snapshot of self.debug_mode; all
+        debug-only work stays behind it.
+        """
         if len(data) < 20:
             return False, False
             
-        ipv4_found = False
-        ipv6_found = False
-        
-        # Convert to hex for more reliable search
-        hex_data = data.hex()
-        
-        # Check IPv4 patterns using hex
-        for i, prefix in enumerate(self.ipv4_prefixes):
-            hex_prefix = prefix.hex()
-            if hex_prefix in hex_data:
-                ipv4_found = True
-                if self.debug_mode and self.stats['debug_packets_shown'] < self.max_debug_packets:
-                    pos = hex_data.find(hex_prefix) // 2
-                    ip_str = f"{prefix[0]}.{prefix[1]}.{prefix[2]}"
-                    logger.debug(f"Found IPv4 pattern #{i} ({ip_str}.x) at byte {pos}")
+        debug_active = debug and self._debug_shown < self.max_debug_packets
+        
+        # All IPv4 patterns in one scan, IPv6 with bytes.find (no allocation).
+        # The message header never carries flow addresses, so skip it
+        match = self._ipv4_prefix_re.search(data, IPFIX_HEADER_LEN)
+        ipv6_pos = data.find(self.ipv6_prefix, IPFIX_HEADER_LEN)
+        
+        if debug_active:
+            if match:
+                prefix = match.group()
+                i = self.ipv4_prefixes.index(prefix)
+                ip_str = f"{prefix[0]}.{prefix[1]}.{prefix[2]}"
+                logger.debug(f"Found IPv4 pattern #{i} ({ip_str}.x) at byte {match.start()}")
+            if ipv6_pos != -1:
+                logger.debug(f"Found IPv6 pattern at byte {ipv6_pos}")
+                
+        return match is not None, ipv6_pos != -1
+        
+    def _parse_ipfix(self, data, exporter):
+        """Learn templates and locate data sets carrying AS fields
+        
+        Returns a list of (start, end, record_len, as_offsets, address_fields)
+        for data sets whose template is known and has both AS and address
+        fields, or None if data is not an IPFIX message.
+        """
+        if len(data) < IPFIX_HEADER_LEN:
+            return None
+            
+        version, length, _, _, domain = struct.unpack_from('!HHIII', data)
+        if version != IPFIX_VERSION:
+            return None
+            
+        # Truncated or malformed message: still IPFIX, so it must not get
+        # the blind non-IPFIX replacement; forward it untouched
+        if length > len(data):
+            return []
+            
+        data_sets = []
+        offset = IPFIX_HEADER_LEN
+        
+        while offset + 4 <= length:
+            set_id, set_len = struct.unpack_from('!HH', data, offset)
+            if set_len < 4 or offset + set_len > length:
                 break
                 
-        # Check IPv6
-        hex_ipv6 = self.ipv6_prefix.hex()
-        if hex_ipv6 in hex_data:
-            ipv6_found = True
-            if self.debug_mode and self.stats['debug_packets_shown'] < self.max_debug_packets:
-                pos = hex_data.find(hex_ipv6) // 2
-                logger.debug(f"Found IPv6 pattern at byte {pos}")
-                
-        # Debug AS search if pattern found
-        if (ipv4_found or ipv6_found) and self.debug_mode and self.stats['debug_packets_shown'] < self.max_debug_packets:
-            as_count = data.count(self.as_zero)
-            if as_count > 0:
-                logger.debug(f"Found {as_count} occurrences of AS 0 to replace")
-                positions = []
-                start = 0
-                while len(positions) < 5:
-                    pos = data.find(self.as_zero, start)
-                    if pos == -1:
-                        break
-                    positions.append(pos)
-                    start = pos + 1
-                logger.debug(f"AS 0 positions: {positions}")
-                with self.stats_lock:
-                    self.stats['as_zero_found'] += as_count
-            else:
-                logger.debug(f"No AS 0 found in packet (searching for {self.as_zero.hex()})")
-                logger.debug(f"First 200 bytes: {data[:200].hex()}")
+            end = offset + set_len
+            if set_id == IPFIX_TEMPLATE_SET_ID:
+                self._learn_templates(data, offset + 4, end, exporter, domain)
+            elif set_id >= IPFIX_MIN_DATA_SET_ID:
+                template = self._templates.get((exporter, domain, set_id))
+                if template and template[1] and template[2]:
+                    data_sets.append((offset + 4, end) + template)
+                    
+            offset = end
+            
+        return data_sets
+        
+    def _learn_templates(self, data, offset, end, exporter, domain):
+        """Cache record length, AS and address field offsets of each template record
+        
+        Address fields are (offset, prefix_len) pairs: a record matches when
+        the first prefix_len bytes of one of them are a target prefix.
+        """
+        ipv4_prefix_len = len(self.ipv4_prefixes[0])
+        ipv6_prefix_len = len(self.ipv6_prefix)
+        
+        while offset + 4 <= end:
+            template_id, field_count = struct.unpack_from('!HH', data, offset)
+            offset += 4
+            
+            # Set padding
+            if template_id < IPFIX_MIN_DATA_SET_ID:
+                break
+                
+            # Template withdrawal
+            if field_count == 0:
+                self._templates.pop((exporter, domain, template_id), None)
+                continue
                 
-            self.stats['debug_packets_shown'] += 1
+            record_len = 0
+            as_offsets = []
+            address_fields = []
+            variable = False
             
-        return ipv4_found, ipv6_found
+            for _ in range(field_count):
+                if offset + 4 > end:
+                    return
+                    
+                ie_id, field_len = struct.unpack_from('!HH', data, offset)
+                offset += 4
+                
+                if ie_id & IPFIX_ENTERPRISE_BIT:
+                    offset += 4
+                elif ie_id in IPFIX_AS_FIELD_IDS and field_len == 4:
+                    as_offsets.append(record_len)
+                elif ie_id in IPFIX_IPV4_FIELD_IDS and field_len == 4:
+                    address_fields.append((record_len, ipv4_prefix_len))
+                elif ie_id in IPFIX_IPV6_FIELD_IDS and field_len == 16:
+                    address_fields.append((record_len, ipv6_prefix_len))
+                    
+                if field_len == IPFIX_VARIABLE_LENGTH:
+                    variable = True
+                else:
+                    record_len += field_len
+                    
+            # Records with variable-length fields have no fixed offsets
+            if variable:
+                as_offsets = []
+                address_fields = []
+                
+            key = (exporter, domain, template_id)
+            if key not in self._templates:
+                logger.debug(f"Learned template {template_id} (exporter {exporter}, domain {domain}): "
+                             f"{record_len} bytes/record, AS offsets {as_offsets}, "
+                             f"address fields {address_fields}")
+            self._templates[key] = (record_len, tuple(as_offsets), tuple(address_fields))
+            
+    def _enrich_packet(self, data, exporter, counts, debug=False):
+        """AS enrichment of template-decoded AS fields
         
-    def _enrich_packet(self, data):
-        """AS enrichment with fixes"""
+        Returns ((data, positions), was_enriched). The packet is not copied:
+        positions lists the offsets the sender overwrites with the target AS
+        when it gathers the datagram. Match and replacement counters are
+        added to the counts dict, which the caller merges into self.stats
+        once per batch.
+        """
         if len(data) < 20:
-            return data, False
+            return (data, ()), False
+            
+        # Templates are learned from every packet, matching or not
+        data_sets = self._parse_ipfix(data, exporter)
+        
+        # Nothing to replace: skip the pattern scans
+        if self.as_zero not in data:
+            return (data, ()), False
             
         # Check patterns
-        ipv4_found, ipv6_found = self._check_patterns(data)
+        ipv4_found, ipv6_found = self._check_patterns(data, debug)
         
         if not (ipv4_found or ipv6_found):
-            return data, False
+            return (data, ()), False
             
-        # Update statistics
-        with self.stats_lock:
-            if ipv4_found:
-                self.stats['ipv4_matched'] += 1
-            if ipv6_found:
-                self.stats['ipv6_matched'] += 1
-                
-        # Replace AS 0 with target AS
-        if self.as_zero in data:
-            enriched = data.replace(self.as_zero, self.as_target)
-            if enriched != data:
-                replacements = data.count(self.as_zero)
-                with self.stats_lock:
-                    self.stats['as_replaced'] += replacements
-                    
-                if self.debug_mode and self.stats['enriched'] < 5:
-                    logger.debug(f"ENRICHED! Replaced {replacements} AS entries from AS0 to AS{self.target_as}")
+        debug_active = debug and self._debug_shown < self.max_debug_packets
+        
+        if data_sets is None:
+            # Not IPFIX: fall back to replacing every AS 0 pattern.
+            # bytes.replace returns the same object when nothing matched
+            replaced = data.replace(self.as_zero, self.as_target)
+            changed = replaced is not data
+            enriched = (replaced, ())
+            
+            # The replacement count only feeds the statistics, so it is
+            # taken on one packet in FALLBACK_COUNT_SAMPLE and scaled
+            replacements = 0
+            if changed:
+                self._fallback_seen += 1
+                if debug:
+                    replacements = data.count(self.as_zero)
+                elif self._fallback_seen % FALLBACK_COUNT_SAMPLE == 0:
+                    replacements = data.count(self.as_zero) * FALLBACK_COUNT_SAMPLE
                     
-                return enriched, True
+            if debug_active:
+                positions = []
+                pos = data.find(self.as_zero)
+                while pos != -1 and len(positions) < 5:
+                    positions.append(pos)
+                    pos = data.find(self.as_zero, pos + 4)
+                self._debug_as_zero(data, replacements, positions)
+        else:
+            # Only rewrite bgpSourceAsNumber/bgpDestinationAsNumber fields,
+            # and only in records whose own addresses are in a target prefix
+            positions = []
+            as_zero = self.as_zero
+            prefixes = self._address_prefixes
+            for start, end, record_len, as_offsets, address_fields in data_sets:
+                for record in range(start, end - record_len + 1, record_len):
+                    for offset, prefix_len in address_fields:
+                        pos = record + offset
+                        if data[pos:pos + prefix_len] in prefixes:
+                            break
+                    else:
+                        continue
+                        
+                    for as_offset in as_offsets:
+                        pos = record + as_offset
+                        if data[pos:pos + 4] == as_zero:
+                            positions.append(pos)
+                            
+            replacements = len(positions)
+            changed = replacements > 0
+            enriched = (data, positions)
                 
-        return data, False
+            if debug_active:
+                self._debug_as_zero(data, replacements, positions[:5])
+                
+        # Update batch counters
+        if ipv4_found:
+            counts['ipv4_matched'] += 1
+        if ipv6_found:
+            counts['ipv6_matched'] += 1
+        counts['as_replaced'] += replacements
+        
+        if changed:
+            if debug and self._debug_enriched_shown < 5:
+                self._debug_enriched_shown += 1
+                logger.debug(f"ENRICHED! Replaced {replacements} AS entries from AS0 to AS{self.target_as}")
+                
+            return enriched, True
+            
+        return (data, ()), False
+        
+    def _gather_parts(self, data, positions):
+        """Split data into slices around positions, with the target AS between"""
+        view = memoryview(data)
+        parts = []
+        last = 0
+        for pos in positions:
+            if pos > last:
+                parts.append(view[last:pos])
+            parts.append(self.as_target)
+            last = pos + 4
+        if last < len(data):
+            parts.append(view[last:])
+        return parts
+        
+    def _debug_as_zero(self, data, as_count, positions):
+        """Log AS 0 occurrences for the first matching packets"""
+        if as_count > 0:
+            logger.debug(f"Found {as_count} occurrences of AS 0 to replace")
+            logger.debug(f"AS 0 positions: {positions}")
+            with self.stats_lock:
+                self.stats['as_zero_found'] += as_count
+        else:
+            logger.debug(f"No AS 0 found in packet (searching for {self.as_zero.hex()})")
+            logger.debug(f"First 200 bytes: {data[:200].hex()}")
+            
+        self._debug_shown += 1
         
     def _sender_thread_func(self):
         """Dedicated thread for sending packets"""
         logger.info("Sender thread started")
         
         consecutive_errors = 0
-        last_send_time = time.time()
+        last_send_ns = time.monotonic_ns()
         eperm_logged = False
+        pending = []
         
         while self.running:
             try:
-                # Get batch of packets from buffer
-                packets = self.send_buffer.get_batch(max_items=50)
+                # Get batch of packets from each receive thread's buffer,
+                # after any left over from EAGAIN (the sender must not
+                # put() into the rings)
+                packets = pending
+                for send_buffer in self.send_buffers:
+                    packets += send_buffer.get_batch(max_items=50)
+                pending = []
                 
                 if not packets:
                     time.sleep(0.001)
                     continue
                     
-                # Send packets
-                for packet_data in packets:
-                    try:
-                        # Check packet size
-                        if len(packet_data) > self.max_packet_size:
-                            with self.stats_lock:
-                                self.stats['oversized'] += 1
-                                
-                            if self.stats['oversized'] == 1:
-                                logger.warning(f"Oversized packet: {len(packet_data)} bytes > {self.max_packet_size} MTU")
-                                logger.warning("Dropping oversized packets to avoid fragmentation")
-                                
-                            continue
-                            
-                        bytes_sent = self.send_sock.sendto(packet_data, self.destination)
+                # Drop oversized packets
+                sendable = []
+                oversized = 0
+                for packet in packets:
+                    if len(packet[0]) > self.max_packet_size:
+                        if oversized == 0 and self.stats['oversized'] == 0:
+                            logger.warning(f"Oversized packet: {len(packet[0])} bytes > {self.max_packet_size} MTU")
+                            logger.warning("Dropping oversized packets to avoid fragmentation")
+                        oversized += 1
+                        continue
                         
-                        with self.stats_lock:
-                            self.stats['sent'] += 1
-                            self.stats['bytes_sent'] += bytes_sent
-                            
+                    sendable.append(packet)
+                    
+                # Send as many as possible with sendmmsg
+                batch_sent = 0
+                batch_bytes = 0
+                if self.mmsg_sender and sendable:
+                    while batch_sent < len(sendable):
+                        chunk = sendable[batch_sent:batch_sent + MMSG_BATCH]
+                        chunk_sent, chunk_bytes = self.mmsg_sender.send(chunk)
+                        batch_sent += chunk_sent
+                        batch_bytes += chunk_bytes
+                        if not chunk_sent:
+                            break
+                    if batch_sent:
+                        consecutive_errors = 0
+                        
+                # Send the rest one by one (also classifies send errors)
+                sent_count = batch_sent
+                sent_bytes = batch_bytes
+                for i in range(batch_sent, len(sendable)):
+                    data, positions = sendable[i]
+                    try:
+                        if positions:
+                            sent_bytes += self.send_sock.sendmsg(self._gather_parts(data, positions),
+                                                                 (), 0, self.destination)
+                        else:
+                            sent_bytes += self.send_sock.sendto(data, self.destination)
+                        sent_count += 1
                         consecutive_errors = 0
-                        last_send_time = time.time()
                         
                     except socket.error as e:
                         if e.errno == errno.EMSGSIZE:
@@ -439,8 +960,10 @@ class IPFIXEnricher:
                                 eperm_logged = True
                                 
                         elif e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
-                            self.send_buffer.put(packet_data)
-                            time.sleep(0.001)
+                            # Socket buffer full: the rest of the batch waits
+                            # for the next pass
+                            pending = sendable[i:]
+                            break
                         else:
                             consecutive_errors += 1
                             self._handle_send_error(e)
@@ -453,10 +976,32 @@ class IPFIXEnricher:
                     except Exception as e:
                         self._handle_send_error(e)
                         
+                # Bound the retry list, dropping the oldest packets
+                retry_dropped = max(0, len(pending) - SEND_RETRY_LIMIT)
+                if retry_dropped:
+                    del pending[:retry_dropped]
+                    
+                # Update statistics once per batch
+                with self.stats_lock:
+                    self.stats['sent'] += sent_count
+                    self.stats['bytes_sent'] += sent_bytes
+                    self.stats['oversized'] += oversized
+                    if retry_dropped:
+                        self.stats['errors'] += retry_dropped
+                        self.stats['error_types']['EAGAIN'] = \
+                            self.stats['error_types'].get('EAGAIN', 0) + retry_dropped
+                            
+                # Back off once when the socket buffer was full
+                if pending:
+                    time.sleep(0.001)
+                    
                 # Timeout check
-                if time.time() - last_send_time > 30:
+                now_ns = time.monotonic_ns()
+                if sent_count:
+                    last_send_ns = now_ns
+                elif now_ns - last_send_ns > 30_000_000_000:
                     logger.warning("No packets sent for 30 seconds")
-                    last_send_time = time.time()
+                    last_send_ns = now_ns
                     
             except Exception as e:
                 logger.error(f"Error in sender thread: {e}")
@@ -483,9 +1028,12 @@ class IPFIXEnricher:
     def _print_stats(self):
         """Print detailed statistics to log file"""
         with self.stats_lock:
+            self.stats['debug_packets_shown'] = self._debug_shown
+            if self._buffer_max_local > self.stats['buffer_max']:
+                self.stats['buffer_max'] = self._buffer_max_local
             stats = self.stats.copy()
-            dropped = self.send_buffer.dropped
-            buffer_size = self.send_buffer.size()
+            dropped = sum(send_buffer.dropped for send_buffer in self.send_buffers)
+            buffer_size = sum(send_buffer.size() for send_buffer in self.send_buffers)
             
         now = time.time()
         uptime = now - self.start_time
@@ -546,9 +1094,10 @@ class IPFIXEnricher:
                                           key=lambda x: x[1], reverse=True)[:5]:
                 stats_msg.append(f"  {error_type}: {count}")
                 
-        if stats.get('size_distribution') and len(stats['size_distribution']) > 1:
+        size_distribution = self._format_size_distribution()
+        if len(size_distribution) > 1:
             stats_msg.append("\nPacket size distribution:")
-            for size_range, count in sorted(stats['size_distribution'].items())[:5]:
+            for size_range, count in size_distribution[:5]:
                 stats_msg.append(f"  {size_range}: {count}")
                 
         stats_msg.append(f"\nMemory: RSS {self._get_memory_usage():.1f} MB")
@@ -566,14 +1115,33 @@ class IPFIXEnricher:
             self.debug_mode = False
             logger.info(f"Debug mode disabled after {int(uptime)}s")
             
+    def _format_size_distribution(self):
+        """Sum the per-thread histograms into (range, count) pairs"""
+        totals = [sum(counts) for counts in zip(*self._size_hists)]
+        
+        distribution = []
+        for bucket, count in enumerate(totals):
+            if not count:
+                continue
+            if bucket == SIZE_HIST_BUCKETS - 1:
+                size_range = f"{bucket * 100}+"
+            else:
+                size_range = f"{bucket * 100}-{(bucket + 1) * 100}"
+            distribution.append((size_range, count))
+            
+        return distribution
+        
     def _get_memory_usage(self):
         """Get memory usage in MB"""
+        if self._status_fd is None:
+            return 0
+            
         try:
-            with open('/proc/self/status', 'r') as f:
-                for line in f:
-                    if line.startswith('VmRSS:'):
-                        return int(line.split()[1]) / 1024
-        except:
+            status = os.pread(self._status_fd, 4096, 0)
+            idx = status.find(b'VmRSS:')
+            if idx != -1:
+                return int(status[idx:idx + 40].split()[1]) / 1024
+        except (OSError, ValueError, IndexError):
             pass
         return 0
         
@@ -589,83 +1157,46 @@ class IPFIXEnricher:
         if not self._setup_sockets():
             return False
             
+        # One buffer per receive thread, drained by the sender thread
+        self.send_buffers = [CircularBuffer(size=self.send_buffer_size)
+                             for _ in self.recv_socks]
+        
         # Start sender thread
         self.sender_thread = threading.Thread(target=self._sender_thread_func, daemon=True)
         self.sender_thread.start()
         
+        # Start receive threads
+        for index, (sock, send_buffer) in enumerate(zip(self.recv_socks, self.send_buffers)):
+            thread = threading.Thread(target=self._rx_loop, args=(index, sock, send_buffer),
+                                      name=f"rx-{index}", daemon=True)
+            thread.start()
+            self.receiver_threads.append(thread)
+            
         logger.info("Service started successfully")
         logger.info(f"Debug mode active for first {self.max_debug_packets} matching packets")
         logger.info("Processing packets...")
         
-        # Buffer for batch processing
-        batch = []
-        batch_start_time = time.time()
-        
         try:
             while self.running:
                 try:
-                    # Use select for efficiency
-                    readable, _, _ = select.select([self.recv_sock], [], [], 0.01)
+                    time.sleep(0.1)
                     
-                    if not readable:
-                        if batch:
-                            self._process_batch(batch)
-                            batch = []
-                        continue
-                        
-                    # Receive packets in batch
-                    while len(batch) < 100:
-                        try:
-                            data, addr = self.recv_sock.recvfrom(65535)
-                            
-                            with self.stats_lock:
-                                self.stats['processed'] += 1
-                                self.stats['bytes_received'] += len(data)
-                                self.stats['last_packet_time'] = time.time()
-                                
-                                # Track max size
-                                if len(data) > self.stats.get('max_packet_seen', 0):
-                                    self.stats['max_packet_seen'] = len(data)
-                                    
-                                # Size distribution
-                                size_bucket = f"{(len(data) // 100) * 100}-{((len(data) // 100) + 1) * 100}"
-                                self.stats['size_distribution'][size_bucket] = \
-                                    self.stats['size_distribution'].get(size_bucket, 0) + 1
-                                
-                            batch.append(data)
-                            self.packets_since_stats += 1
-                            
-                        except socket.error as e:
-                            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
-                                break
-                            else:
-                                raise
-                                
-                    # Process batch if full or timeout
-                    if len(batch) >= 50 or (time.time() - batch_start_time) > 0.01:
-                        self._process_batch(batch)
-                        batch = []
-                        batch_start_time = time.time()
-                        
                     # Periodic statistics
+                    now_ns = time.monotonic_ns()
                     if self.packets_since_stats >= 5000 or \
-                       (time.time() - self.last_stats_time) >= 30:
+                       now_ns - self.last_stats_ns >= 30_000_000_000:
                         self._print_stats()
                         self.packets_since_stats = 0
-                        self.last_stats_time = time.time()
+                        self.last_stats_ns = now_ns
                         
                     # Periodic garbage collection
-                    if (time.time() - self.last_gc_time) >= 300:
+                    if now_ns - self.last_gc_ns >= 300_000_000_000:
                         gc.collect()
-                        self.last_gc_time = time.time()
+                        self.last_gc_ns = now_ns
                         
                 except KeyboardInterrupt:
                     break
                     
-                except Exception as e:
-                    logger.error(f"Processing error: {e}")
-                    time.sleep(0.01)
-                    
         except Exception as e:
             logger.critical(f"FATAL ERROR: {e}")
             import traceback
@@ -675,7 +1206,11 @@ class IPFIXEnricher:
             logger.info("Shutting down...")
             self.running = False
             
-            # Wait for sender thread
+            # Wait for receive threads, then the sender thread
+            for thread in self.receiver_threads:
+                if thread.is_alive():
+                    thread.join(timeout=5)
+                    
             if self.sender_thread and self.sender_thread.is_alive():
                 self.sender_thread.join(timeout=5)
                 
@@ -683,7 +1218,7 @@ class IPFIXEnricher:
             self._print_stats()
             
             # Check remaining buffer
-            remaining = self.send_buffer.size()
+            remaining = sum(send_buffer.size() for send_buffer in self.send_buffers)
             if remaining > 0:
                 logger.warning(f"{remaining} packets in buffer not sent")
                 
@@ -692,29 +1227,156 @@ class IPFIXEnricher:
             
         return True
         
-    def _process_batch(self, batch):
-        """Process a batch of packets"""
-        for data in batch:
-            # Enrich packet
-            enriched_data, was_enriched = self._enrich_packet(data)
+    def _pin_thread(self, index):
+        """Pin the calling thread to one of the allowed CPUs"""
+        if not self.cpu_affinity or not hasattr(os, 'sched_setaffinity'):
+            return
             
-            if was_enriched:
-                with self.stats_lock:
-                    self.stats['enriched'] += 1
+        try:
+            cpus = sorted(os.sched_getaffinity(0))
+            core = cpus[index % len(cpus)]
+            os.sched_setaffinity(0, {core})
+            logger.info(f"Receive thread {index} pinned to CPU {core}")
+        except OSError as e:
+            logger.debug(f"Could not pin receive thread {index}: {e}")
+            
+    def _rx_loop(self, index, sock, send_buffer):
+        """Receive loop for one SO_REUSEPORT socket"""
+        self._pin_thread(index)
+        receiver = MMsgReceiver(sock) if libc is not None else None
+        
+        # Packet size histogram, only written by this thread
+        size_hist = array.array('q', [0] * SIZE_HIST_BUCKETS)
+        self._size_hists.append(size_hist)
+        last_bucket = SIZE_HIST_BUCKETS - 1
+        
+        # Buffer for batch processing
+        batch = []
+        batch_start_ns = time.monotonic_ns()
+        
+        while self.running:
+            try:
+                # Wait up to 10 ms for packets, then drain what is queued
+                packets = self._receive(sock, receiver, 100 - len(batch))
+                
+                if not packets:
+                    if batch:
+                        self._process_batch(batch, send_buffer)
+                        batch = []
+                    continue
+                    
+                # Count received packets in locals, then update the
+                # shared statistics with a single lock acquisition
+                local_bytes = 0
+                local_max = 0
+                for data, _ in packets:
+                    size = len(data)
+                    local_bytes += size
+                    
+                    # Track max size
+                    if size > local_max:
+                        local_max = size
+                        
+                    # Size distribution
+                    size_hist[min(size // 100, last_bucket)] += 1
                     
-            # Add to send buffer
-            if not self.send_buffer.put(enriched_data):
                 with self.stats_lock:
-                    self.stats['dropped'] += 1
+                    self.stats['processed'] += len(packets)
+                    self.stats['bytes_received'] += local_bytes
+                    self.stats['last_packet_time'] = time.time()
                     
-            # Update peak buffer
-            buffer_size = self.send_buffer.size()
-            with self.stats_lock:
-                if buffer_size > self.stats.get('buffer_max', 0):
-                    self.stats['buffer_max'] = buffer_size
+                    if local_max > self.stats.get('max_packet_seen', 0):
+                        self.stats['max_packet_seen'] = local_max
+                        
+                    self.packets_since_stats += len(packets)
+                    
+                batch.extend(packets)
+                
+                # Process batch if full or timeout
+                now_ns = time.monotonic_ns()
+                if len(batch) >= 50 or now_ns - batch_start_ns > 10_000_000:
+                    self._process_batch(batch, send_buffer)
+                    batch = []
+                    batch_start_ns = now_ns
+                    
+            except Exception as e:
+                logger.error(f"Processing error: {e}")
+                time.sleep(0.01)
+                
+    def _receive(self, sock, receiver, max_items):
+        """Wait up to 10 ms for packets, then receive up to max_items
+        
+        Returns (data, exporter) pairs; exporter is the sender's (ip, port).
+        """
+        packets = []
+        
+        if receiver:
+            wait = True
+            while len(packets) < max_items:
+                wanted = min(max_items - len(packets), MMSG_BATCH)
+                received = receiver.recv(wanted, wait)
+                packets.extend(received)
+                if len(received) < wanted:
+                    break
+                wait = False
+            return packets
+            
+        # Use select for efficiency
+        readable, _, _ = select.select([sock], [], [], 0.01)
+        if not readable:
+            return packets
+            
+        while len(packets) < max_items:
+            try:
+                packets.append(sock.recvfrom(65535))
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                else:
+                    raise
+                    
+        return packets
+        
+    def _process_batch(self, batch, send_buffer):
+        """Process a batch of (data, exporter) packets"""
+        counts = {'ipv4_matched': 0, 'ipv6_matched': 0, 'as_replaced': 0}
+        enriched = 0
+        dropped = 0
+        debug = self.debug_mode
+        
+        for data, exporter in batch:
+            # Enrich packet
+            enriched_data, was_enriched = self._enrich_packet(data, exporter, counts, debug)
+            
+            if was_enriched:
+                enriched += 1
+                
+            # Add to send buffer
+            if not send_buffer.put(enriched_data):
+                dropped += 1
+                
+        # Sample the peak buffer once per batch
+        buffer_size = send_buffer.size()
+        if buffer_size > self._buffer_max_local:
+            self._buffer_max_local = buffer_size
+            
+        # Update statistics once per batch
+        with self.stats_lock:
+            for key, count in counts.items():
+                self.stats[key] += count
+            self.stats['enriched'] += enriched
+            self.stats['dropped'] += dropped
 
 def main():
     """Entry point"""
+    # Setup logging before anything else
+    setup_logging()
+    
+    # Log startup
+    logger.info("="*60)
+    logger.info("IPFIX AS Enricher v5.1 starting...")
+    logger.info("="*60)
+    
     try:
         # Set process priority
         try:
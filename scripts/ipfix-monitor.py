@@ -9,29 +9,205 @@ import curses
 import time
 import re
 import os
+import mmap
+import array
+import functools
 import sys
+import threading
 import subprocess
 from collections import deque
 from datetime import datetime
 import argparse
 import signal
 
+# Metrics reported in the enricher's statistics block
+_PATTERNS = {
+    'uptime': r'Uptime: (\d+)s',
+    'mtu': r'MTU: (\d+) bytes',
+    'ipv4_matches': r'IPv4 matches: ([\d,]+) packets',
+    'ipv6_matches': r'IPv6 matches: ([\d,]+) packets',
+    'match_rate': r'Total match rate: ([\d.]+)%',
+    'as_replaced': r'AS replaced: ([\d,]+) times',
+    'processed': r'Processed: ([\d,]+) packets \(([\d.]+) pps, ([\d.]+) Mbps\)',
+    'enriched': r'Enriched: ([\d,]+) \(([\d.]+)%\)',
+    'sent': r'Sent: ([\d,]+) \(([\d.]+)% success\)',
+    'oversized': r'Oversized dropped: ([\d,]+)',
+    'buffer_dropped': r'Buffer dropped: ([\d,]+)',
+    'errors': r'Errors: ([\d,]+)',
+    'forward_rate': r'Rate: ([\d.]+) pps, ([\d.]+) Mbps',
+    'buffer_current': r'Current size: (\d+)',
+    'buffer_peak': r'Peak size: (\d+)',
+    'memory': r'Memory: RSS ([\d.]+) MB',
+    'error_detail': r'(\w+): (\d+)',
+}
+
+# All metrics in one alternation, compiled once: a match names its metric
+# in lastgroup and its values are the groups nested inside that one.
+# Every metric starts with a word character, so the leading \b lets the
+# scan skip mid-word positions; without it a long run of word characters
+# with no ': ' after it makes (\w+) retry from every offset (quadratic).
+# Log lines are parsed as bytes, so the pattern is compiled as bytes too
+MASTER_RE = re.compile(
+    (r'\b(?:' + '|'.join(f'(?P<{key}>{pattern})' for key, pattern in _PATTERNS.items()) + ')').encode()
+)
+_VALUE_GROUPS = {
+    key: (MASTER_RE.groupindex[key], MASTER_RE.groupindex[key] + re.compile(pattern).groups)
+    for key, pattern in _PATTERNS.items()
+}
+
+def _to_int(value):
+    """Parse a counter that may use thousands separators"""
+    return int(value.translate(None, b','))
+
+# Result field and converter for each value captured by a metric
+# (error_detail is handled separately: it fills the error_types dict)
+_CONVERTERS = {
+    'uptime': (('uptime', int),),
+    'mtu': (('mtu', int),),
+    'ipv4_matches': (('ipv4_matches', _to_int),),
+    'ipv6_matches': (('ipv6_matches', _to_int),),
+    'match_rate': (('match_rate', float),),
+    'as_replaced': (('as_replaced', _to_int),),
+    'processed': (('processed', _to_int), ('pps_in', float), ('mbps_in', float)),
+    'enriched': (('enriched', _to_int), ('enrichment_rate', float)),
+    'sent': (('sent', _to_int), ('success_rate', float)),
+    'oversized': (('oversized', _to_int),),
+    'buffer_dropped': (('buffer_dropped', _to_int),),
+    'errors': (('errors', _to_int),),
+    'forward_rate': (('pps_out', float), ('mbps_out', float)),
+    'buffer_current': (('buffer_current', int),),
+    'buffer_peak': (('buffer_peak', int),),
+    'memory': (('memory', float),),
+}
+
+# A whole statistics block: the header line, then the body lines up to a
+# line that starts with '====' and holds a 40-'=' separator. A body line
+# may not contain another header (a new header restarts the block), and
+# the body needs at least one line
+BLOCK_RE = re.compile(
+    rb'Statistics:[^\n]*\n'
+    rb'((?:(?![^\n]*Statistics:)[^\n]*\n)+?)'
+    rb'(?=={4})[^\n]*?={40}'
+)
+
+# Runs of bars or dots in a graph row, drawn with one addstr each
+_GRAPH_RUNS = re.compile(r'#+|\.+')
+
+@functools.lru_cache(maxsize=None)
+def _row_table(row_level):
+    """Translation table mapping a column height to '#' or '.' for one row"""
+    return bytes(35 if level >= row_level else 46 for level in range(256))
+
+def _quantize(values, low, high, height):
+    """Render values in [low, high] as graph rows of '#'/'.', top row first
+    
+    Column heights are packed into bytes so that each row is a single
+    C-level translate() instead of a per-cell Python loop.
+    """
+    scale = (height - 1) / (high - low)
+    levels = bytes([int((val - low) * scale) for val in values])
+    return [levels.translate(_row_table(row_level)).decode('ascii')
+            for row_level in range(height - 1, -1, -1)]
+
+class RingBuffer:
+    """Fixed-size numeric history in a preallocated array (oldest first)
+    
+    The minimum and maximum of the stored values are kept up to date on
+    append; the array is rescanned only when the evicted sample was one
+    of them.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.data = array.array('d', bytes(8 * size))
+        self.head = 0  # Next slot to write
+        self.count = 0
+        self.low = 0.0
+        self.high = 0.0
+        
+    def append(self, value):
+        full = self.count == self.size
+        evicted = self.data[self.head]
+        self.data[self.head] = value
+        self.head = (self.head + 1) % self.size
+        
+        if self.count == 0:
+            self.low = self.high = value
+        elif full and (evicted <= self.low or evicted >= self.high):
+            self.low = min(self.data)
+            self.high = max(self.data)
+        else:
+            if value < self.low:
+                self.low = value
+            if value > self.high:
+                self.high = value
+                
+        if not full:
+            self.count += 1
+            
+    def clear(self):
+        self.head = 0
+        self.count = 0
+        self.low = 0.0
+        self.high = 0.0
+        
+    def values(self):
+        """Stored values, oldest first"""
+        if self.count < self.size:
+            return self.data[:self.count]
+        return self.data[self.head:] + self.data[:self.head]
+        
+    def last(self, n):
+        """The newest n values, oldest first"""
+        n = min(n, self.count)
+        start = self.head - n
+        if start >= 0:
+            return self.data[start:self.head]
+        return self.data[start:] + self.data[:self.head]
+        
+    def copy(self):
+        """Independent copy, for handing the history to another thread"""
+        clone = RingBuffer(0)
+        clone.__dict__.update(self.__dict__)
+        clone.data = array.array('d', self.data)
+        return clone
+        
+    def __len__(self):
+        return self.count
+        
+    def __iter__(self):
+        return iter(self.values())
+
+def _new_history():
+    """Empty graph history: 5 minutes of 1-second samples per series"""
+    return {
+        'timestamps': deque(maxlen=300),
+        'success_rate': RingBuffer(300),
+        'pps_in': RingBuffer(300),
+        'pps_out': RingBuffer(300),
+        'enrichment_rate': RingBuffer(300),
+        'errors': RingBuffer(300),
+        'buffer_size': RingBuffer(300),
+    }
+
 class IPFIXMonitor:
     def __init__(self, log_file='/var/log/ipfix-enricher/ipfix-enricher.log'):
         self.log_file = log_file
         self.running = True
         
-        # Stats storage
+        # Stats storage shown by the UI: the latest snapshot published by
+        # the reader thread
         self.current_stats = {}
-        self.history = {
-            'timestamps': deque(maxlen=300),  # 5 minutes of 1-second samples
-            'success_rate': deque(maxlen=300),
-            'pps_in': deque(maxlen=300),
-            'pps_out': deque(maxlen=300),
-            'enrichment_rate': deque(maxlen=300),
-            'errors': deque(maxlen=300),
-            'buffer_size': deque(maxlen=300),
-        }
+        self.history = _new_history()
+        
+        # Reader thread side: stats and history as parsed from the log. The
+        # UI never touches these; it takes the copies published in _snapshot
+        # when _updated is set
+        self._stats = {}
+        self._history = _new_history()
+        self._snapshot = (self.current_stats, self.history)
+        self._updated = threading.Event()
+        self._reset_history = threading.Event()
+        self._reader_error = None
         
         # Alert thresholds
         self.alerts = {
@@ -43,11 +219,17 @@ class IPFIXMonitor:
         # Active alerts
         self.active_alerts = []
         
-        # Last log position
+        # Log file kept open between refreshes; last_position is where the
+        # next block search starts (the header of a block still being
+        # written, or the end of the last complete line)
+        self.log_fd = None
+        self.log_inode = None
         self.last_position = 0
         
-        # Colors
+        # Colors, and the combined attributes used for titles and alerts
         self.colors = {}
+        self.bold_colors = {}
+        self.alert_attr = 0
         
     def init_colors(self):
         """Initialize color pairs"""
@@ -67,109 +249,146 @@ class IPFIXMonitor:
             'normal': curses.color_pair(5),
             'header': curses.color_pair(6),
         }
+        self.bold_colors = {name: attr | curses.A_BOLD for name, attr in self.colors.items()}
+        self.alert_attr = self.colors['error'] | curses.A_BOLD | curses.A_BLINK
         
-    def parse_log_line(self, line):
-        """Parse statistics from log line"""
-        # Look for statistics blocks
-        if "Statistics:" in line:
-            return {'stats_start': True}
-            
-        # Parse various metrics
-        patterns = {
-            'uptime': r'Uptime: (\d+)s',
-            'mtu': r'MTU: (\d+) bytes',
-            'ipv4_matches': r'IPv4 matches: ([\d,]+) packets',
-            'ipv6_matches': r'IPv6 matches: ([\d,]+) packets',
-            'match_rate': r'Total match rate: ([\d.]+)%',
-            'as_replaced': r'AS replaced: ([\d,]+) times',
-            'processed': r'Processed: ([\d,]+) packets \(([\d.]+) pps, ([\d.]+) Mbps\)',
-            'enriched': r'Enriched: ([\d,]+) \(([\d.]+)%\)',
-            'sent': r'Sent: ([\d,]+) \(([\d.]+)% success\)',
-            'oversized': r'Oversized dropped: ([\d,]+)',
-            'buffer_dropped': r'Buffer dropped: ([\d,]+)',
-            'errors': r'Errors: ([\d,]+)',
-            'forward_rate': r'Rate: ([\d.]+) pps, ([\d.]+) Mbps',
-            'buffer_current': r'Current size: (\d+)',
-            'buffer_peak': r'Peak size: (\d+)',
-            'memory': r'Memory: RSS ([\d.]+) MB',
-            'error_detail': r'(\w+): (\d+)',
-        }
+    def _parse_metrics(self, buf, pos, endpos):
+        """Run MASTER_RE over buf[pos:endpos] without copying the span
         
+        buf may be bytes or the log mmap; only the captured values are
+        materialised.
+        """
         results = {}
         
-        for key, pattern in patterns.items():
-            match = re.search(pattern, line)
-            if match:
-                if key == 'processed':
-                    results['processed'] = int(match.group(1).replace(',', ''))
-                    results['pps_in'] = float(match.group(2))
-                    results['mbps_in'] = float(match.group(3))
-                elif key == 'enriched':
-                    results['enriched'] = int(match.group(1).replace(',', ''))
-                    results['enrichment_rate'] = float(match.group(2))
-                elif key == 'sent':
-                    results['sent'] = int(match.group(1).replace(',', ''))
-                    results['success_rate'] = float(match.group(2))
-                elif key == 'forward_rate':
-                    results['pps_out'] = float(match.group(1))
-                    results['mbps_out'] = float(match.group(2))
-                elif key in ['uptime', 'mtu', 'buffer_current', 'buffer_peak']:
-                    results[key] = int(match.group(1))
-                elif key in ['ipv4_matches', 'ipv6_matches', 'as_replaced', 'oversized', 'buffer_dropped', 'errors']:
-                    results[key] = int(match.group(1).replace(',', ''))
-                elif key in ['match_rate', 'memory']:
-                    results[key] = float(match.group(1))
-                elif key == 'error_detail' and 'error_types' not in results:
-                    results['error_types'] = {}
-                    results['error_types'][match.group(1)] = int(match.group(2))
-                    
+        for match in MASTER_RE.finditer(buf, pos, endpos):
+            key = match.lastgroup
+            start, end = _VALUE_GROUPS[key]
+            values = match.groups()[start:end]
+            
+            if key == 'error_detail':
+                results.setdefault('error_types', {})[values[0].decode('utf-8', errors='ignore')] = int(values[1])
+                continue
+                
+            for (field, convert), value in zip(_CONVERTERS[key], values):
+                results[field] = convert(value)
+                
         return results
         
     def read_latest_stats(self):
-        """Read latest statistics from log file"""
-        try:
-            if not os.path.exists(self.log_file):
-                return
-                
-            with open(self.log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                # Seek to last position
-                f.seek(self.last_position)
+        """Read latest statistics from log file
+        
+        Returns True if a complete statistics block was read.
+        """
+        if self.log_fd is None and not self._open_log():
+            return False
+            
+        updated = self._read_new_blocks()
+        
+        # On rotation finish the old file, then continue with the new one
+        if self._log_rotated():
+            os.close(self.log_fd)
+            self.log_fd = None
+            if self._open_log() and self._read_new_blocks():
+                updated = True
                 
-                stats_block = []
-                in_stats = False
+        return updated
+        
+    def _reader_loop(self):
+        """Reader thread: poll the log and publish snapshots for the UI
+        
+        Disk latency (slow disks, NFS) stalls only this thread; the UI keeps
+        drawing the last snapshot.
+        """
+        try:
+            while self.running:
+                updated = self.read_latest_stats()
                 
-                for line in f:
-                    parsed = self.parse_log_line(line)
+                if self._reset_history.is_set():
+                    self._reset_history.clear()
+                    for hist in self._history.values():
+                        hist.clear()
+                    updated = True
                     
-                    if parsed.get('stats_start'):
-                        in_stats = True
-                        stats_block = []
-                    elif in_stats and '=' * 40 in line and stats_block:
-                        # End of stats block, process it
-                        for stat_line in stats_block:
-                            stat_data = self.parse_log_line(stat_line)
-                            self.current_stats.update({k: v for k, v in stat_data.items() if v is not None})
-                        in_stats = False
-                        
-                        # Update history
-                        timestamp = datetime.now()
-                        self.history['timestamps'].append(timestamp)
-                        self.history['success_rate'].append(self.current_stats.get('success_rate', 0))
-                        self.history['pps_in'].append(self.current_stats.get('pps_in', 0))
-                        self.history['pps_out'].append(self.current_stats.get('pps_out', 0))
-                        self.history['enrichment_rate'].append(self.current_stats.get('enrichment_rate', 0))
-                        self.history['errors'].append(self.current_stats.get('errors', 0))
-                        self.history['buffer_size'].append(self.current_stats.get('buffer_current', 0))
-                        
-                    elif in_stats:
-                        stats_block.append(line)
-                        
-                # Save position
-                self.last_position = f.tell()
-                
+                if updated:
+                    self._publish()
+                    
+                time.sleep(0.5)
         except Exception as e:
-            pass
+            # Surfaced by run() so it is reported after curses has exited
+            self._reader_error = e
+            self.running = False
+            
+    def _publish(self):
+        """Hand copies of the reader state to the UI with one reference swap"""
+        self._snapshot = (dict(self._stats),
+                          {key: hist.copy() for key, hist in self._history.items()})
+        self._updated.set()
+        
+    def _open_log(self):
+        """Open the log file from the start; False if it does not exist"""
+        try:
+            self.log_fd = os.open(self.log_file, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+            
+        self.log_inode = os.fstat(self.log_fd).st_ino
+        self.last_position = 0
+        return True
+        
+    def _log_rotated(self):
+        """Check whether the log path now names a different file"""
+        try:
+            return os.stat(self.log_file).st_ino != self.log_inode
+        except FileNotFoundError:
+            # Between rename and creation of the new file
+            return False
+            
+    def _read_new_blocks(self):
+        """Parse statistics blocks completed since the last read"""
+        updated = False
+        
+        # Truncated in place: start over
+        size = os.fstat(self.log_fd).st_size
+        if size < self.last_position:
+            self.last_position = 0
+            
+        # Nothing new since the last refresh
+        if size <= self.last_position:
+            return False
             
+        # Match whole blocks straight from the page cache, up to the last
+        # complete line; a block still being written is found again next time
+        with mmap.mmap(self.log_fd, size, access=mmap.ACCESS_READ) as mm:
+            pos = self.last_position
+            limit = mm.rfind(b'\n', pos) + 1
+            if limit == 0:
+                return False
+                
+            for block in BLOCK_RE.finditer(mm, pos, limit):
+                self._apply_block(self._parse_metrics(mm, block.start(1), block.end(1)))
+                pos = block.end()
+                updated = True
+                
+            # Resume at the last header not yet closed, if any
+            pending = mm.rfind(b"Statistics:", pos, limit)
+            self.last_position = limit if pending == -1 else pending
+            
+        return updated
+        
+    def _apply_block(self, stat_data):
+        """Merge one parsed statistics block and extend the history"""
+        self._stats.update({k: v for k, v in stat_data.items() if v is not None})
+        
+        # Update history
+        timestamp = datetime.now()
+        self._history['timestamps'].append(timestamp)
+        self._history['success_rate'].append(self._stats.get('success_rate', 0))
+        self._history['pps_in'].append(self._stats.get('pps_in', 0))
+        self._history['pps_out'].append(self._stats.get('pps_out', 0))
+        self._history['enrichment_rate'].append(self._stats.get('enrichment_rate', 0))
+        self._history['errors'].append(self._stats.get('errors', 0))
+        self._history['buffer_size'].append(self._stats.get('buffer_current', 0))
+        
     def check_alerts(self):
         """Check for alert conditions"""
         self.active_alerts = []
@@ -186,9 +405,9 @@ class IPFIXMonitor:
             
         # Check error rate
         if len(self.history['errors']) > 1:
-            recent_errors = list(self.history['errors'])[-10:]
+            recent_errors = self.history['errors'].last(10)
             if len(recent_errors) > 1:
-                error_rate = recent_errors[-1] - recent_errors[0]
+                error_rate = int(recent_errors[-1] - recent_errors[0])
                 if error_rate > self.alerts['error_rate_high']:
                     self.active_alerts.append(f"HIGH ERROR RATE: {error_rate} errors/sample")
                     
@@ -198,14 +417,10 @@ class IPFIXMonitor:
         subtitle = f"Monitoring: {self.log_file}"
         
         # Title
-        stdscr.attron(self.colors['header'] | curses.A_BOLD)
-        stdscr.addstr(y, x + (width - len(title)) // 2, title)
-        stdscr.attroff(self.colors['header'] | curses.A_BOLD)
+        stdscr.addstr(y, x + (width - len(title)) // 2, title, self.bold_colors['header'])
         
         # Subtitle
-        stdscr.attron(self.colors['info'])
-        stdscr.addstr(y + 1, x + (width - len(subtitle)) // 2, subtitle)
-        stdscr.attroff(self.colors['info'])
+        stdscr.addstr(y + 1, x + (width - len(subtitle)) // 2, subtitle, self.colors['info'])
         
         # Separator
         stdscr.addstr(y + 2, x, "-" * width)
@@ -215,14 +430,10 @@ class IPFIXMonitor:
     def draw_alerts(self, stdscr, y, x, width):
         """Draw alerts section"""
         if self.active_alerts:
-            stdscr.attron(self.colors['error'] | curses.A_BOLD | curses.A_BLINK)
-            stdscr.addstr(y, x, "! ALERTS:")
-            stdscr.attroff(self.colors['error'] | curses.A_BOLD | curses.A_BLINK)
+            stdscr.addstr(y, x, "! ALERTS:", self.alert_attr)
             
             for i, alert in enumerate(self.active_alerts[:3]):
-                stdscr.attron(self.colors['error'])
-                stdscr.addstr(y + i + 1, x + 2, f"* {alert}")
-                stdscr.attroff(self.colors['error'])
+                stdscr.addstr(y + i + 1, x + 2, f"* {alert}", self.colors['error'])
                 
             return y + len(self.active_alerts) + 2
         return y
@@ -237,17 +448,11 @@ class IPFIXMonitor:
         
         def draw_stat(y, label, value, color='normal', col=1):
             stat_x = col1_x if col == 1 else col2_x
-            stdscr.attron(self.colors['info'])
-            stdscr.addstr(y, stat_x, f"{label}:")
-            stdscr.attroff(self.colors['info'])
-            stdscr.attron(self.colors[color])
-            stdscr.addstr(y, stat_x + len(label) + 2, str(value))
-            stdscr.attroff(self.colors[color])
+            stdscr.addstr(y, stat_x, f"{label}:", self.colors['info'])
+            stdscr.addstr(y, stat_x + len(label) + 2, str(value), self.colors[color])
             
         # Processing stats
-        stdscr.attron(self.colors['header'] | curses.A_BOLD)
-        stdscr.addstr(y, x, "PROCESSING")
-        stdscr.attroff(self.colors['header'] | curses.A_BOLD)
+        stdscr.addstr(y, x, "PROCESSING", self.bold_colors['header'])
         y += 1
         
         uptime = stats.get('uptime', 0)
@@ -269,9 +474,7 @@ class IPFIXMonitor:
         y += 2
         
         # Forwarding stats
-        stdscr.attron(self.colors['header'] | curses.A_BOLD)
-        stdscr.addstr(y, x, "FORWARDING")
-        stdscr.attroff(self.colors['header'] | curses.A_BOLD)
+        stdscr.addstr(y, x, "FORWARDING", self.bold_colors['header'])
         y += 1
         
         success_rate = stats.get('success_rate', 0)
@@ -287,9 +490,7 @@ class IPFIXMonitor:
         y += 2
         
         # Buffer stats
-        stdscr.attron(self.colors['header'] | curses.A_BOLD)
-        stdscr.addstr(y, x, "BUFFER & MEMORY")
-        stdscr.attroff(self.colors['header'] | curses.A_BOLD)
+        stdscr.addstr(y, x, "BUFFER & MEMORY", self.bold_colors['header'])
         y += 1
         
         buffer_current = stats.get('buffer_current', 0)
@@ -305,14 +506,12 @@ class IPFIXMonitor:
             return y + height
             
         # Title
-        stdscr.attron(self.colors['info'])
-        stdscr.addstr(y, x, f"{label}:")
-        stdscr.attroff(self.colors['info'])
+        stdscr.addstr(y, x, f"{label}:", self.colors['info'])
         
-        # Calculate scale
-        data_list = list(data)
-        max_val = max(data_list) if data_list else 1
-        min_val = min(data_list) if data_list else 0
+        # Calculate scale (the ring tracks its own range)
+        data_list = data.values()
+        max_val = data.high
+        min_val = data.low
         
         if max_val == min_val:
             max_val = min_val + 1
@@ -321,27 +520,28 @@ class IPFIXMonitor:
         graph_height = height - 2
         graph_width = width - 10  # Leave space for scale
         
-        for i in range(graph_height):
+        # Columns holding data, rendered once per graph
+        first = max(0, len(data_list) - graph_width)
+        start_col = max(0, graph_width - len(data_list))
+        end_col = min(len(data_list), graph_width)
+        rows = _quantize(data_list[first:first + max(0, end_col - start_col)],
+                         min_val, max_val, graph_height)
+        
+        for i, row in enumerate(rows):
             y_pos = y + 1 + i
             
             # Y-axis label
             y_val = max_val - (max_val - min_val) * i / (graph_height - 1)
             stdscr.addstr(y_pos, x, f"{y_val:6.1f}")
             
-            # Graph line
-            for j in range(min(len(data_list), graph_width)):
-                data_idx = len(data_list) - graph_width + j
-                if data_idx >= 0:
-                    val = data_list[data_idx]
-                    normalized = (val - min_val) / (max_val - min_val)
+            # Graph line, drawn run by run
+            for run in _GRAPH_RUNS.finditer(row):
+                run_x = x + 8 + start_col + run.start()
+                if row[run.start()] == '#':
+                    stdscr.addstr(y_pos, run_x, run.group(), self.colors[color])
+                else:
+                    stdscr.addstr(y_pos, run_x, run.group())
                     
-                    if (graph_height - 1 - i) <= normalized * (graph_height - 1):
-                        stdscr.attron(self.colors[color])
-                        stdscr.addstr(y_pos, x + 8 + j, "#")
-                        stdscr.attroff(self.colors[color])
-                    else:
-                        stdscr.addstr(y_pos, x + 8 + j, ".")
-                        
         # X-axis
         stdscr.addstr(y + height - 1, x + 8, "L" + "-" * (graph_width - 1))
         
@@ -349,101 +549,133 @@ class IPFIXMonitor:
         if data_list:
             current = data_list[-1]
             current_str = f"Current: {current:.1f}{unit}"
-            stdscr.attron(self.colors[color] | curses.A_BOLD)
-            stdscr.addstr(y, x + width - len(current_str) - 1, current_str)
-            stdscr.attroff(self.colors[color] | curses.A_BOLD)
+            stdscr.addstr(y, x + width - len(current_str) - 1, current_str, self.bold_colors[color])
             
         return y + height
         
     def draw_help(self, stdscr, y, x, width):
         """Draw help section"""
         help_text = "q: Quit | r: Reset | F5: Refresh"
-        stdscr.attron(self.colors['info'])
-        stdscr.addstr(y, x + (width - len(help_text)) // 2, help_text)
-        stdscr.attroff(self.colors['info'])
+        stdscr.addstr(y, x + (width - len(help_text)) // 2, help_text, self.colors['info'])
         
     def run(self, stdscr):
         """Main UI loop"""
         # Setup
         curses.curs_set(0)  # Hide cursor
+        stdscr.leaveok(True)  # No cursor moves after each update
         stdscr.nodelay(1)   # Non-blocking input
         stdscr.timeout(1000)  # Refresh every second
         
         self.init_colors()
         
+        # Frames are drawn into an off-screen pad and copied out with
+        # noutrefresh/doupdate, so ncurses only sends the cells that changed.
+        # stdscr itself is refreshed once so getch() never repaints it
+        stdscr.refresh()
+        pad = None
+        
+        # Redraw only when new statistics arrived, the terminal was resized
+        # or a key asked for it
+        dirty = True
+        drawn_size = None
+        
+        # Log IO runs in its own thread; this loop only swaps in snapshots
+        reader = threading.Thread(target=self._reader_loop, name="log-reader", daemon=True)
+        reader.start()
+        
         while self.running:
             try:
-                # Read latest stats
-                self.read_latest_stats()
-                self.check_alerts()
-                
-                # Clear screen
-                stdscr.clear()
-                
+                # Take the latest stats published by the reader
+                if self._updated.is_set():
+                    self._updated.clear()
+                    self.current_stats, self.history = self._snapshot
+                    dirty = True
+                    
                 # Get dimensions
                 height, width = stdscr.getmaxyx()
-                
-                # Draw sections
-                y = 0
-                y = self.draw_header(stdscr, y, 0, width)
-                y = self.draw_alerts(stdscr, y, 0, width)
-                y = self.draw_stats(stdscr, y, 0, width)
-                
-                # Draw graphs if space available
-                if height - y > 20:
-                    y += 1
-                    stdscr.attron(self.colors['header'] | curses.A_BOLD)
-                    stdscr.addstr(y, 0, "PERFORMANCE GRAPHS")
-                    stdscr.attroff(self.colors['header'] | curses.A_BOLD)
-                    y += 1
+                if (height, width) != drawn_size:
+                    dirty = True
                     
-                    graph_height = 6
-                    half_width = width // 2 - 1
-                    
-                    # Success rate graph
-                    success_color = 'good' if self.current_stats.get('success_rate', 0) > 90 else 'warning'
-                    self.draw_graph(stdscr, y, 0, half_width, graph_height, 
-                                  self.history['success_rate'], "Success Rate", "%", success_color)
-                    
-                    # PPS graph
-                    self.draw_graph(stdscr, y, half_width + 1, half_width, graph_height,
-                                  self.history['pps_out'], "Packets/sec Out", " pps", 'info')
-                    
-                    y += graph_height + 1
-                    
-                    # Buffer graph
-                    buffer_color = 'good' if self.current_stats.get('buffer_current', 0) < 1000 else 'warning'
-                    self.draw_graph(stdscr, y, 0, half_width, graph_height,
-                                  self.history['buffer_size'], "Buffer Size", "", buffer_color)
-                    
-                    # Enrichment rate graph
-                    self.draw_graph(stdscr, y, half_width + 1, half_width, graph_height,
-                                  self.history['enrichment_rate'], "Enrichment Rate", "%", 'good')
+                if dirty:
+                    if (height, width) != drawn_size:
+                        pad = curses.newpad(height, width)
+                        pad.leaveok(True)
+                        
+                    self.check_alerts()
+                    self.draw_screen(pad, height, width)
+                    drawn_size = (height, width)
+                    dirty = False
                     
-                # Help at bottom
-                self.draw_help(stdscr, height - 1, 0, width)
-                
-                # Refresh
-                stdscr.refresh()
-                
                 # Handle input
                 key = stdscr.getch()
                 if key == ord('q'):
                     self.running = False
                 elif key == ord('r'):
-                    # Reset history
+                    # Reset history here and in the reader
                     for hist in self.history.values():
                         hist.clear()
-                elif key == curses.KEY_F5:
+                    self._reset_history.set()
+                    dirty = True
+                elif key in (curses.KEY_F5, curses.KEY_RESIZE):
                     # Force refresh
-                    pass
+                    dirty = True
                     
             except KeyboardInterrupt:
                 self.running = False
-            except Exception as e:
-                # Continue on errors
+            except curses.error:
+                # Drawing past the edge of a small terminal
                 pass
                 
+        if self._reader_error is not None:
+            raise self._reader_error
+            
+    def draw_screen(self, stdscr, height, width):
+        """Draw the whole dashboard into a pad and show it"""
+        # Reuse the pad's cells instead of forcing a full repaint
+        stdscr.erase()
+        
+        # Draw sections
+        y = 0
+        y = self.draw_header(stdscr, y, 0, width)
+        y = self.draw_alerts(stdscr, y, 0, width)
+        y = self.draw_stats(stdscr, y, 0, width)
+        
+        # Draw graphs if space available
+        if height - y > 20:
+            y += 1
+            stdscr.addstr(y, 0, "PERFORMANCE GRAPHS", self.bold_colors['header'])
+            y += 1
+            
+            graph_height = 6
+            half_width = width // 2 - 1
+            
+            # Success rate graph
+            success_color = 'good' if self.current_stats.get('success_rate', 0) > 90 else 'warning'
+            self.draw_graph(stdscr, y, 0, half_width, graph_height, 
+                          self.history['success_rate'], "Success Rate", "%", success_color)
+            
+            # PPS graph
+            self.draw_graph(stdscr, y, half_width + 1, half_width, graph_height,
+                          self.history['pps_out'], "Packets/sec Out", " pps", 'info')
+            
+            y += graph_height + 1
+            
+            # Buffer graph
+            buffer_color = 'good' if self.current_stats.get('buffer_current', 0) < 1000 else 'warning'
+            self.draw_graph(stdscr, y, 0, half_width, graph_height,
+                          self.history['buffer_size'], "Buffer Size", "", buffer_color)
+            
+            # Enrichment rate graph
+            self.draw_graph(stdscr, y, half_width + 1, half_width, graph_height,
+                          self.history['enrichment_rate'], "Enrichment Rate", "%", 'good')
+            
+        # Help at bottom
+        self.draw_help(stdscr, height - 1, 0, width)
+        
+        # Copy to the screen and update the terminal once
+        stdscr.noutrefresh(0, 0, 0, 0, height - 1, width - 1)
+        curses.doupdate()
+        
 def main():
     """Entry point"""
     parser = argparse.ArgumentParser(description='IPFIX Enricher Monitor')
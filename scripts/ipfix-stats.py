@@ -7,11 +7,47 @@ Simple text-based stats viewer for ipfix-enricher
 
 import time
 import re
+import io
 import os
+import mmap
 import sys
 import argparse
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 
+# The last statistics block is looked for in this much of the end of the
+# log, recent errors in this much
+STATS_WINDOW = 1024 * 1024
+ERROR_SCAN_SIZE = 64 * 1024
+
+# While the log is not written to, the refresh interval doubles up to this
+# (seconds)
+IDLE_REFRESH_MAX = 30
+
+# Cursor home + erase below, instead of spawning clear(1) every refresh
+CLEAR_SCREEN = '\033[H\033[J'
+
+# Separator lines around statistics blocks are runs of at least this
+_SEPARATOR = b'=' * 50
+
+# Metrics compared against thresholds or formatted as numbers, converted
+# once when parsed; the others are shown as logged
+_CONVERTERS = {
+    'uptime': int,
+    'success_rate': float,
+    'enrichment': float,
+    'match_rate': float,
+    'errors': int,
+    'buffer': int,
+    'processed': int,
+    'sent': int,
+    'oversized': int,
+    'buffer_dropped': int,
+}
+
+# Lines reported under "Recent Errors"
+_is_error_line = re.compile(rb'\b(?:ERROR|WARNING)\b').search
+
 class IPFIXStats:
     def __init__(self, log_file='/var/log/ipfix-enricher/ipfix-enricher.log', refresh_rate=5):
         self.log_file = log_file
@@ -28,112 +64,224 @@ class IPFIXStats:
             'NC': '\033[0m'  # No Color
         }
         
-    def get_last_stats_block(self):
-        """Extract the last statistics block from log file"""
+        # Color thresholds per metric as (search, bounds, colors): the bisect
+        # position of the value among the bounds selects the color. Higher
+        # is better with bisect_right (a value equal to a bound moves up),
+        # lower is better with bisect_left (it stays down)
+        green, yellow, red = self.colors['GREEN'], self.colors['YELLOW'], self.colors['RED']
+        self._thresholds = {
+            'success_rate': (bisect_right, (70, 90), (red, yellow, green)),
+            'enrichment': (bisect_right, (80, 95), (red, yellow, green)),
+            'match_rate': (bisect_right, (80, 95), (red, yellow, green)),
+            'errors': (bisect_left, (10, 100), (green, yellow, red)),
+            'buffer': (bisect_left, (1000, 5000), (green, yellow, red)),
+        }
+        
+        # Colored text that is the same on every frame, built once
+        nc = self.colors['NC']
+        self._header_prefix = f"{self.colors['BLUE']}IPFIX Enricher Stats - "
+        self._recent_errors_title = f"\n{yellow}Recent Errors:{nc}"
+        self._alert_success_low = f"{red}? ALERT: Low success rate!{nc}"
+        self._alert_buffer_high = f"{yellow}? WARNING: High buffer usage!{nc}"
+        self._alert_errors_high = f"{red}? ALERT: High error count!{nc}"
+        self._footer = f"\n{'-'*60}\nRefreshing in {refresh_rate} seconds...\n"
+        
+        # Log file kept open between refreshes (reopened on rotation) and
+        # mapped to scan its end in place
+        self._fh = None
+        self._ino = None
+        
+        # What the screen currently shows, to skip redrawing the same frame
+        self._last_key = None
+        
+        # Last block parsed and its metrics: the daemon logs statistics less
+        # often than most refresh rates, so the same block comes back
+        self._last_block = None
+        self._last_metrics = {}
+        
+        # Inode, size and mtime of the log at the last full refresh
+        self._last_log_state = None
+        
+        # Metric patterns, one per statistics line, with a named group per
+        # value and the literal text the line starts with. They are fused
+        # into a single alternation; each literal is located with str.find
+        # and the fused pattern is only tried at that offset
+        patterns = [
+            ('[', r'\[(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]'),
+            ('Uptime: ', r'Uptime: (?P<uptime>\d+)s'),
+            ('MTU: ', r'MTU: (?P<mtu>\d+) bytes'),
+            ('Total match rate: ', r'Total match rate: (?P<match_rate>[\d.]+)%'),
+            ('Processed: ', r'Processed: (?P<processed>[\d,]+) packets(?: \((?P<pps_in>[\d.]+) pps(?:, (?P<mbps_in>[\d.]+) Mbps\))?)?'),
+            ('Enriched: ', r'Enriched: [\d,]+ \((?P<enrichment>[\d.]+)%\)'),
+            ('Sent: ', r'Sent: (?P<sent>[\d,]+)(?: \((?P<success_rate>[\d.]+)% success\))?'),
+            ('Oversized dropped: ', r'Oversized dropped: (?P<oversized>[\d,]+)'),
+            ('Buffer dropped: ', r'Buffer dropped: (?P<buffer_dropped>[\d,]+)'),
+            ('Errors: ', r'Errors: (?P<errors>[\d,]+)'),
+            ('Rate: ', r'Rate: (?P<pps_out>[\d.]+) pps(?:, (?P<mbps_out>[\d.]+) Mbps)?'),
+            ('Current size: ', r'Current size: (?P<buffer>\d+)'),
+            ('Peak size: ', r'Peak size: (?P<buffer_peak>\d+)'),
+            ('Memory: RSS ', r'Memory: RSS (?P<memory>[\d.]+) MB'),
+        ]
+        self._literals = [(literal, tuple(re.compile(pattern).groupindex)) for literal, pattern in patterns]
+        self._metrics_re = re.compile('|'.join(pattern for _, pattern in patterns))
+        
+    def _open_log(self):
+        """Open the log, or reopen it when the path names a new file"""
+        if self._fh is not None:
+            try:
+                if os.stat(self.log_file).st_ino == self._ino:
+                    return
+            except FileNotFoundError:
+                # Between rename and creation of the new file
+                return
+            self._fh.close()
+            self._fh = None
+            
+        self._fh = open(self.log_file, 'rb')
+        self._ino = os.fstat(self._fh.fileno()).st_ino
+        
+    def _read_tail(self):
+        """Map the log read-only for one refresh, or None if empty/unreadable
+        
+        The statistics block and the recent errors are both searched in
+        this one view; pages are only read where they are touched.
+        """
         try:
-            with open(self.log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                
-            # Find all statistics blocks
-            blocks = re.split(r'={50,}', content)
+            self._open_log()
+            size = os.fstat(self._fh.fileno()).st_size
+            if size == 0:
+                return None
+            return mmap.mmap(self._fh.fileno(), size, access=mmap.ACCESS_READ)
             
-            # Find the last block containing "Statistics:"
-            for block in reversed(blocks):
-                if 'Statistics:' in block:
-                    return block
-                    
+        except Exception as e:
             return None
             
-        except Exception as e:
+    def _extract_stats_block(self, mm):
+        """Last statistics block in the mapped log; only it is copied"""
+        if mm is None:
+            return None
+            
+        # The last block is the piece between separator runs around
+        # the last "Statistics:"; searching backwards from the end
+        # only touches the pages holding it
+        size = len(mm)
+        window = max(0, size - STATS_WINDOW)
+        pos = mm.rfind(b'Statistics:', window)
+        if pos == -1:
             return None
             
+        # The last separator window before it ends its run
+        begin = mm.rfind(_SEPARATOR, window, pos)
+        if begin != -1:
+            begin += len(_SEPARATOR)
+        elif window == 0:
+            begin = 0
+        else:
+            # Block starts before the window
+            return None
+            
+        end = mm.find(_SEPARATOR, pos)
+        if end == -1:
+            end = size
+            
+        return mm[begin:end].decode('utf-8', errors='ignore')
+        
+    def _log_state(self):
+        """Cheap change signal for the log, or None if it can't be stat'ed"""
+        try:
+            st = os.stat(self.log_file)
+            return (st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError:
+            return None
+            
+    def get_last_stats_block(self):
+        """Extract the last statistics block from log file"""
+        mm = self._read_tail()
+        try:
+            return self._extract_stats_block(mm)
+        finally:
+            if mm is not None:
+                mm.close()
+                
     def parse_stats(self, stats_block):
         """Parse statistics from the block"""
         if not stats_block:
             return {}
             
         metrics = {}
+        match_at = self._metrics_re.match
         
-        # Define patterns
-        patterns = {
-            'timestamp': r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]',
-            'uptime': r'Uptime: (\d+)s',
-            'mtu': r'MTU: (\d+) bytes',
-            'success_rate': r'Sent: .* \(([\d.]+)% success\)',
-            'pps_in': r'Processed: .* \(([\d.]+) pps',
-            'mbps_in': r'Processed: .* ([\d.]+) Mbps\)',
-            'pps_out': r'Rate: ([\d.]+) pps',
-            'mbps_out': r'Rate: .* ([\d.]+) Mbps',
-            'enrichment': r'Enriched: .* \(([\d.]+)%\)',
-            'match_rate': r'Total match rate: ([\d.]+)%',
-            'errors': r'Errors: ([\d,]+)',
-            'buffer': r'Current size: (\d+)',
-            'buffer_peak': r'Peak size: (\d+)',
-            'memory': r'Memory: RSS ([\d.]+) MB',
-            'processed': r'Processed: ([\d,]+) packets',
-            'sent': r'Sent: ([\d,]+)',
-            'oversized': r'Oversized dropped: ([\d,]+)',
-            'buffer_dropped': r'Buffer dropped: ([\d,]+)'
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, stats_block)
-            if match:
-                value = match.group(1)
-                # Remove commas for numeric values
-                if key in ['errors', 'processed', 'sent', 'oversized', 'buffer_dropped']:
-                    value = value.replace(',', '')
+        for literal, keys in self._literals:
+            # No regex work for lines missing from the block; a line still
+            # being written may not match yet, so try later occurrences
+            pos = stats_block.find(literal)
+            while pos != -1:
+                match = match_at(stats_block, pos)
+                if match:
+                    break
+                pos = stats_block.find(literal, pos + 1)
+            else:
+                continue
+                
+            # Only the groups of the branch that matched
+            for key, value in zip(keys, map(match.group, keys)):
+                if value is None:
+                    continue
+                convert = _CONVERTERS.get(key)
+                if convert is not None:
+                    # Remove commas for numeric values
+                    value = convert(value.replace(',', ''))
                 metrics[key] = value
                 
         return metrics
         
-    def get_color_for_value(self, value, good_threshold, warning_threshold, reverse=False):
-        """Get color based on value and thresholds"""
-        try:
-            val = float(value)
-            if reverse:
-                if val <= good_threshold:
-                    return self.colors['GREEN']
-                elif val <= warning_threshold:
-                    return self.colors['YELLOW']
-                else:
-                    return self.colors['RED']
-            else:
-                if val >= good_threshold:
-                    return self.colors['GREEN']
-                elif val >= warning_threshold:
-                    return self.colors['YELLOW']
-                else:
-                    return self.colors['RED']
-        except:
-            return self.colors['NC']
+    def _pick_color(self, key, value):
+        """Color for a metric value from its threshold table"""
+        search, bounds, colors = self._thresholds[key]
+        return colors[search(bounds, value)]
+        
+    def _recent_errors_from(self, mm):
+        """Last error lines within the end of the mapped log"""
+        if mm is None:
+            return []
+            
+        end = len(mm)
+        start = max(0, end - ERROR_SCAN_SIZE)
+        floor = -1
+        if start > 0:
+            # First line may be cut short
+            floor = mm.find(b'\n', start)
+            if floor == -1:
+                return []
+                
+        # Walk lines backwards from the end in place, copying out only
+        # the ones reported
+        errors = []
+        while end > floor and len(errors) < 3:
+            nl = mm.rfind(b'\n', start, end)
+            if _is_error_line(mm, nl + 1, end):
+                # Clean and truncate line
+                clean_line = mm[nl + 1:end].decode('utf-8', errors='ignore').strip()
+                if len(clean_line) > 80:
+                    clean_line = clean_line[:77] + '...'
+                errors.append(clean_line)
+            end = nl
             
+        errors.reverse()
+        return errors
+        
     def get_recent_errors(self):
-        """Get recent error messages from log"""
+        """Get recent error messages from the end of the log"""
+        mm = self._read_tail()
         try:
-            with open(self.log_file, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
+            return self._recent_errors_from(mm)
+        finally:
+            if mm is not None:
+                mm.close()
                 
-            errors = []
-            for line in reversed(lines):
-                if 'ERROR' in line or 'WARNING' in line:
-                    # Clean and truncate line
-                    clean_line = line.strip()
-                    if len(clean_line) > 80:
-                        clean_line = clean_line[:77] + '...'
-                    errors.append(clean_line)
-                    
-                    if len(errors) >= 3:
-                        break
-                        
-            return list(reversed(errors))
-            
-        except:
-            return []
-            
     def clear_screen(self):
         """Clear terminal screen"""
-        os.system('clear' if os.name == 'posix' else 'cls')
+        sys.stdout.write(CLEAR_SCREEN)
         
     def format_uptime(self, seconds):
         """Format uptime in human readable format"""
@@ -146,113 +294,137 @@ class IPFIXStats:
         except:
             return "0h 0m 0s"
             
-    def display_stats(self, metrics):
-        """Display formatted statistics"""
-        self.clear_screen()
+    def format_header(self):
+        """Title line with the current time"""
+        return f"{self._header_prefix}{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}{self.colors['NC']}"
+        
+    def refresh_header(self):
+        """Rewrite only the title line, leaving the cursor where it was"""
+        sys.stdout.write(f"\0337\033[H{self.format_header()}\0338")
+        sys.stdout.flush()
+        
+    def display_stats(self, metrics, recent_errors=None, footer=''):
+        """Display formatted statistics
+        
+        recent_errors is fetched from the log when not given. The frame,
+        including the screen clear and footer, goes out in a single write.
+        """
+        buf = io.StringIO()
+        buf.write(CLEAR_SCREEN)
+        self._write_frame(buf.write, metrics, recent_errors)
+        buf.write(footer)
+        sys.stdout.write(buf.getvalue())
+        sys.stdout.flush()
+        
+    def _write_frame(self, w, metrics, recent_errors):
+        """Write the lines of one stats frame through w"""
+        colors = self.colors
+        nc = colors['NC']
         
         # Header
-        print(f"{self.colors['BLUE']}IPFIX Enricher Stats - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}{self.colors['NC']}")
-        print("=" * 60)
+        w(self.format_header() + '\n')
+        w("=" * 60 + "\n")
         
         if not metrics:
-            print("\nWaiting for statistics...")
+            w("\nWaiting for statistics...\n")
             return
             
         # Basic info
         if 'uptime' in metrics:
             uptime_str = self.format_uptime(metrics['uptime'])
-            print(f"\nUptime: {self.colors['CYAN']}{uptime_str}{self.colors['NC']}")
+            w(f"\nUptime: {colors['CYAN']}{uptime_str}{nc}\n")
             
         # Success rate
         if 'success_rate' in metrics:
-            success_rate = float(metrics['success_rate'])
-            color = self.get_color_for_value(success_rate, 90, 70)
-            print(f"\nSuccess Rate: {color}{success_rate:.1f}%{self.colors['NC']}")
+            success_rate = metrics['success_rate']
+            color = self._pick_color('success_rate', success_rate)
+            w(f"\nSuccess Rate: {color}{success_rate:.1f}%{nc}\n")
             
         # Traffic
-        print("\nTraffic:")
+        w("\nTraffic:\n")
         if 'pps_in' in metrics:
-            print(f"  In:  {metrics['pps_in']} pps", end='')
+            w(f"  In:  {metrics['pps_in']} pps")
             if 'mbps_in' in metrics:
-                print(f" / {metrics['mbps_in']} Mbps")
+                w(f" / {metrics['mbps_in']} Mbps\n")
             else:
-                print()
+                w('\n')
                 
         if 'pps_out' in metrics:
-            print(f"  Out: {metrics['pps_out']} pps", end='')
+            w(f"  Out: {metrics['pps_out']} pps")
             if 'mbps_out' in metrics:
-                print(f" / {metrics['mbps_out']} Mbps")
+                w(f" / {metrics['mbps_out']} Mbps\n")
             else:
-                print()
+                w('\n')
                 
         # Enrichment
         if 'enrichment' in metrics:
-            enrich_rate = float(metrics['enrichment'])
-            color = self.get_color_for_value(enrich_rate, 95, 80)
-            print(f"  Enrichment: {color}{enrich_rate:.1f}%{self.colors['NC']}")
+            enrich_rate = metrics['enrichment']
+            color = self._pick_color('enrichment', enrich_rate)
+            w(f"  Enrichment: {color}{enrich_rate:.1f}%{nc}\n")
             
         if 'match_rate' in metrics:
-            match_rate = float(metrics['match_rate'])
-            color = self.get_color_for_value(match_rate, 95, 80)
-            print(f"  Pattern Match: {color}{match_rate:.1f}%{self.colors['NC']}")
+            match_rate = metrics['match_rate']
+            color = self._pick_color('match_rate', match_rate)
+            w(f"  Pattern Match: {color}{match_rate:.1f}%{nc}\n")
             
         # Errors and drops
-        print("\nHealth:")
+        w("\nHealth:\n")
         if 'errors' in metrics:
-            errors = int(metrics['errors'])
-            color = self.get_color_for_value(errors, 10, 100, reverse=True)
-            print(f"  Errors: {color}{errors:,}{self.colors['NC']}")
+            errors = metrics['errors']
+            color = self._pick_color('errors', errors)
+            w(f"  Errors: {color}{errors:,}{nc}\n")
             
         if 'buffer' in metrics:
-            buffer = int(metrics['buffer'])
-            color = self.get_color_for_value(buffer, 1000, 5000, reverse=True)
-            print(f"  Buffer: {color}{buffer:,}{self.colors['NC']}", end='')
+            buffer = metrics['buffer']
+            color = self._pick_color('buffer', buffer)
+            w(f"  Buffer: {color}{buffer:,}{nc}")
             if 'buffer_peak' in metrics:
-                print(f" (peak: {metrics['buffer_peak']})")
+                w(f" (peak: {metrics['buffer_peak']})\n")
             else:
-                print()
+                w('\n')
                 
         if 'oversized' in metrics:
-            oversized = int(metrics['oversized'])
+            oversized = metrics['oversized']
             if oversized > 0:
-                print(f"  Oversized dropped: {self.colors['YELLOW']}{oversized:,}{self.colors['NC']}")
+                w(f"  Oversized dropped: {colors['YELLOW']}{oversized:,}{nc}\n")
                 
         if 'buffer_dropped' in metrics:
-            dropped = int(metrics['buffer_dropped'])
+            dropped = metrics['buffer_dropped']
             if dropped > 0:
-                print(f"  Buffer dropped: {self.colors['RED']}{dropped:,}{self.colors['NC']}")
+                w(f"  Buffer dropped: {colors['RED']}{dropped:,}{nc}\n")
                 
         if 'memory' in metrics:
-            print(f"  Memory: {metrics['memory']} MB")
+            w(f"  Memory: {metrics['memory']} MB\n")
             
         # Counts
-        print("\nCounts:")
+        w("\nCounts:\n")
         if 'processed' in metrics:
-            print(f"  Processed: {int(metrics['processed']):,} packets")
+            w(f"  Processed: {metrics['processed']:,} packets\n")
         if 'sent' in metrics:
-            print(f"  Sent: {int(metrics['sent']):,} packets")
+            w(f"  Sent: {metrics['sent']:,} packets\n")
             
         # Recent errors
-        if 'errors' in metrics and int(metrics['errors']) > 0:
-            recent_errors = self.get_recent_errors()
+        if 'errors' in metrics and metrics['errors'] > 0:
+            if recent_errors is None:
+                recent_errors = self.get_recent_errors()
             if recent_errors:
-                print(f"\n{self.colors['YELLOW']}Recent Errors:{self.colors['NC']}")
+                w(self._recent_errors_title + '\n')
                 for error in recent_errors:
-                    print(f"  {error}")
+                    w(f"  {error}\n")
                     
         # Alerts
         alerts = []
-        if 'success_rate' in metrics and float(metrics['success_rate']) < 50:
-            alerts.append(f"{self.colors['RED']}? ALERT: Low success rate!{self.colors['NC']}")
-        if 'buffer' in metrics and int(metrics['buffer']) > 5000:
-            alerts.append(f"{self.colors['YELLOW']}? WARNING: High buffer usage!{self.colors['NC']}")
-        if 'errors' in metrics and int(metrics['errors']) > 1000:
-            alerts.append(f"{self.colors['RED']}? ALERT: High error count!{self.colors['NC']}")
+        if 'success_rate' in metrics and metrics['success_rate'] < 50:
+            alerts.append(self._alert_success_low)
+        if 'buffer' in metrics and metrics['buffer'] > 5000:
+            alerts.append(self._alert_buffer_high)
+        if 'errors' in metrics and metrics['errors'] > 1000:
+            alerts.append(self._alert_errors_high)
             
         if alerts:
-            print("\nAlerts:")
+            w("\nAlerts:\n")
             for alert in alerts:
-                print(f"  {alert}")
+                w(f"  {alert}\n")
                 
     def run(self):
         """Main loop"""
@@ -260,15 +432,44 @@ class IPFIXStats:
         print("=" * 60)
         
         try:
+            delay = self.refresh_rate
             while self.running:
-                stats_block = self.get_last_stats_block()
-                metrics = self.parse_stats(stats_block)
-                self.display_stats(metrics)
+                # Nothing was written since the last refresh: only update the
+                # clock, and back off while the log stays idle
+                log_state = self._log_state()
+                if log_state is not None and log_state == self._last_log_state:
+                    self.refresh_header()
+                    delay = min(delay * 2, max(self.refresh_rate, IDLE_REFRESH_MAX))
+                    time.sleep(delay)
+                    continue
+                self._last_log_state = log_state
+                delay = self.refresh_rate
                 
-                print(f"\n{'-'*60}")
-                print(f"Refreshing in {self.refresh_rate} seconds...")
-                
-                time.sleep(self.refresh_rate)
+                # One view of the log serves the block and the errors
+                tail = self._read_tail()
+                try:
+                    stats_block = self._extract_stats_block(tail)
+                    if stats_block != self._last_block:
+                        self._last_block = stats_block
+                        self._last_metrics = self.parse_stats(stats_block)
+                    metrics = self._last_metrics
+                    recent_errors = []
+                    if 'errors' in metrics and metrics['errors'] > 0:
+                        recent_errors = self._recent_errors_from(tail)
+                finally:
+                    if tail is not None:
+                        tail.close()
+                        
+                # Redraw only when something shown would change; otherwise
+                # just bring the clock in the title up to date
+                key = (tuple(sorted(metrics.items())), tuple(recent_errors))
+                if key == self._last_key:
+                    self.refresh_header()
+                else:
+                    self.display_stats(metrics, recent_errors, self._footer)
+                    self._last_key = key
+                    
+                time.sleep(delay)
                 
         except KeyboardInterrupt:
             print(f"\n\n{self.colors['BLUE']}Exiting...{self.colors['NC']}")
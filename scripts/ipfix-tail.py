@@ -7,9 +7,21 @@ Colored tail for ipfix-enricher logs
 
 import sys
 import re
+import os
 import time
-import subprocess
 import argparse
+from functools import partial
+
+# How often the log is checked for new data while it is idle
+POLL_INTERVAL = 0.25
+
+# Read size when scanning back from the end for the initial lines
+READ_CHUNK = 64 * 1024
+
+# Colored lines are written in batches: once this many are pending, or
+# once the oldest has waited this long (seconds)
+FLUSH_LINES = 64
+FLUSH_INTERVAL = 0.1
 
 class ColoredTail:
     def __init__(self, log_file='/var/log/ipfix-enricher/ipfix-enricher.log'):
@@ -27,53 +39,157 @@ class ColoredTail:
             'BOLD': '\033[1m'
         }
         
-    def colorize_line(self, line):
-        """Apply colors to log line"""
-        # Color log levels
-        for level, color in self.colors.items():
-            if level in ['ERROR', 'WARNING', 'CRITICAL', 'INFO', 'DEBUG']:
-                line = re.sub(f'\\b{level}\\b', f'{color}{level}{self.colors["RESET"]}', line)
-                
+        # Lines are colored as raw bytes, so the patterns and the colored
+        # replacements are bytes as well
+        colors = {name: code.encode() for name, code in self.colors.items()}
+        reset = colors['RESET']
+        
+        # Log levels, success rates and error counts in one alternation,
+        # compiled once: each line is scanned a single time and the
+        # callback dispatches on the alternative that matched
+        self._color_re = re.compile(
+            rb'\b(?P<level>ERROR|WARNING|CRITICAL|INFO|DEBUG)\b'
+            rb'|(?P<success>\d+\.?\d*)% success'
+            rb'|Errors: (?P<errors>\d+)'
+        )
+        self._colored_levels = {
+            level.encode(): colors[level] + level.encode() + reset
+            for level in ('ERROR', 'WARNING', 'CRITICAL', 'INFO', 'DEBUG')
+        }
+        self._success_format = colors['SUCCESS'] + b'%s%% success' + reset
+        self._errors_format = {
+            True: b'Errors: ' + colors['ERROR'] + b'%s' + reset,
+            False: b'Errors: ' + colors['SUCCESS'] + b'%s' + reset,
+        }
+        
+        # Substitutions with the callback bound once, not per line. The
+        # numeric alternatives make the full pattern try a match at every
+        # digit, so lines without their literals take the levels-only one
+        self._sub_colors = partial(self._color_re.sub, self._color_match)
+        self._sub_levels = partial(
+            re.compile(rb'\b(?:ERROR|WARNING|CRITICAL|INFO|DEBUG)\b').sub,
+            self._color_match
+        )
+        self._statistics_format = colors['BOLD'] + b'%s' + reset
+        
+    def _color_match(self, m):
+        """Colored replacement for one match of the line pattern"""
+        # Log levels are by far the most common match: the matched text
+        # is its own lookup key
+        colored = self._colored_levels.get(m.group())
+        if colored is not None:
+            return colored
+            
         # Color success rates
-        line = re.sub(r'(\d+\.?\d*)% success', 
-                     lambda m: f'{self.colors["SUCCESS"]}{m.group(1)}% success{self.colors["RESET"]}', 
-                     line)
-                     
+        if m.lastgroup == 'success':
+            return self._success_format % m.group('success')
+            
         # Color high numbers in errors
-        if 'Errors:' in line:
-            line = re.sub(r'Errors: (\d+)', 
-                         lambda m: f'Errors: {self.colors["ERROR"] if int(m.group(1)) > 0 else self.colors["SUCCESS"]}{m.group(1)}{self.colors["RESET"]}', 
-                         line)
-                         
+        value = m.group('errors')
+        return self._errors_format[int(value) > 0] % value
+        
+    def colorize_line(self, line):
+        """Apply colors to log line (bytes)"""
+        if b'% success' in line or b'Errors: ' in line:
+            line = self._sub_colors(line)
+        else:
+            line = self._sub_levels(line)
+        
         # Highlight statistics header
-        if 'Statistics:' in line:
-            line = f'{self.colors["BOLD"]}{line}{self.colors["RESET"]}'
+        if b'Statistics:' in line:
+            line = self._statistics_format % line
             
         return line
         
-    def run(self):
+    def _open_log(self, lines):
+        """Open the log positioned at the start of its last `lines` lines"""
+        f = open(self.log_file, 'rb', buffering=0)
+        pos = f.seek(0, os.SEEK_END)
+        if lines <= 0:
+            return f
+            
+        # Read back from the end until enough line breaks are buffered
+        data = b''
+        while pos > 0 and data.count(b'\n') <= lines:
+            step = min(READ_CHUNK, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+            
+        # A final line break ends the last line rather than starting one
+        cut = len(data) - 1 if data.endswith(b'\n') else len(data)
+        for _ in range(lines):
+            cut = data.rfind(b'\n', 0, cut)
+            if cut == -1:
+                break
+                
+        f.seek(pos + cut + 1)
+        return f
+        
+    def _log_replaced(self, f):
+        """Check whether the log was rotated or truncated under f"""
+        try:
+            if os.stat(self.log_file).st_ino != os.fstat(f.fileno()).st_ino:
+                return True
+        except FileNotFoundError:
+            # Between rename and creation of the new file
+            return False
+        return os.fstat(f.fileno()).st_size < f.tell()
+        
+    def _flush(self, out):
+        """Write the pending lines with a single call"""
+        if out:
+            sys.stdout.buffer.write(b''.join(out))
+            out.clear()
+        sys.stdout.buffer.flush()
+        
+    def run(self, lines=10):
         """Run colored tail"""
+        out = []
         try:
-            # Use subprocess to tail the file
-            tail_process = subprocess.Popen(
-                ['tail', '-f', self.log_file],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True,
-                bufsize=1
-            )
+            # Follow the file directly instead of piping through tail -f
+            f = self._open_log(lines)
+            leftover = b''
             
             print(f"Tailing {self.log_file} (Ctrl+C to stop)...")
             print("-" * 60)
+            # Colored lines bypass the text layer: send the banner first
+            sys.stdout.flush()
+            last_flush = time.monotonic()
             
-            # Process each line
-            for line in tail_process.stdout:
-                colored_line = self.colorize_line(line.rstrip())
-                print(colored_line)
-                
+            while True:
+                data = os.read(f.fileno(), READ_CHUNK)
+                if not data:
+                    # Nothing more to batch with: show what is pending
+                    self._flush(out)
+                    last_flush = time.monotonic()
+                    
+                    # Idle: pick up a rotated or truncated log from its start
+                    if self._log_replaced(f):
+                        f.close()
+                        f = open(self.log_file, 'rb', buffering=0)
+                        leftover = b''
+                    else:
+                        time.sleep(POLL_INTERVAL)
+                    continue
+                    
+                # Process each complete line as bytes, without decoding; a
+                # partial one waits for the rest
+                chunk_lines = (leftover + data).split(b'\n')
+                leftover = chunk_lines.pop()
+                for line in chunk_lines:
+                    out.append(self.colorize_line(line.rstrip()) + b'\n')
+                    if len(out) >= FLUSH_LINES:
+                        self._flush(out)
+                        last_flush = time.monotonic()
+                        
+                if time.monotonic() - last_flush > FLUSH_INTERVAL:
+                    self._flush(out)
+                    last_flush = time.monotonic()
+                    
         except KeyboardInterrupt:
+            self._flush(out)
             print("\n\nStopping tail...")
-            tail_process.terminate()
             
         except Exception as e:
             print(f"Error: {e}")
@@ -93,7 +209,7 @@ def main():
     
     # Create and run colored tail
     tail = ColoredTail(args.log_file)
-    tail.run()
+    tail.run(args.lines)
     
 if __name__ == '__main__':
     main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IPFIX parsing tests for the enricher
+"""
+
+import os
+import signal
+import struct
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ipfix_enricher import IPFIXEnricher, IPFIX_VERSION, IPFIX_HEADER_LEN, IPFIX_ENTERPRISE_BIT
+
+EXPORTER = ('192.0.2.1', 4739)
+
+def template_set(template_id, fields):
+    """Template set with one template of (ie_id, length) fields"""
+    body = struct.pack('!HH', template_id, len(fields))
+    body += b''.join(struct.pack('!HH', ie_id, length) for ie_id, length in fields)
+    return struct.pack('!HH', 2, 4 + len(body)) + body
+    
+def data_set(template_id, records):
+    """Data set holding the given encoded records"""
+    body = b''.join(records)
+    return struct.pack('!HH', template_id, 4 + len(body)) + body
+    
+def message(*sets, domain=0):
+    """IPFIX message with the given sets"""
+    body = b''.join(sets)
+    return struct.pack('!HHIII', IPFIX_VERSION, IPFIX_HEADER_LEN + len(body), 0, 0, domain) + body
+    
+# Data sets start right after the message and set headers
+FIRST_RECORD = IPFIX_HEADER_LEN + 4
+
+MATCHING_IPV4 = bytes([185, 54, 81, 7])
+OTHER_IPV4 = bytes([198, 51, 100, 7])
+
+class ParseIPFIXTest(unittest.TestCase):
+    def setUp(self):
+        # The constructor installs SIGINT/SIGTERM handlers and opens
+        # /proc/self/status; both are undone in tearDown
+        self.saved_handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGINT, signal.SIGTERM)}
+        self.enricher = IPFIXEnricher()
+        self.enricher.debug_mode = False
+        
+    def tearDown(self):
+        self.enricher._cleanup_sockets()
+        for sig, handler in self.saved_handlers.items():
+            signal.signal(sig, handler)
+            
+    def _message(self, body, length=None):
+        """IPFIX message around body; length overrides the header field"""
+        if length is None:
+            length = IPFIX_HEADER_LEN + len(body)
+        return struct.pack('!HHIII', IPFIX_VERSION, length, 0, 0, 1) + body
+        
+    def test_only_as_fields_are_rewritten(self):
+        # packetDeltaCount, srcIPv4, dstIPv4, srcAS, dstAS
+        self.enricher._parse_ipfix(message(template_set(256, [(2, 8), (8, 4), (12, 4), (16, 4), (17, 4)])), EXPORTER)
+        self.assertEqual(self.enricher._templates[(EXPORTER, 0, 256)][:2], (24, (16, 20)))
+        
+        # Zero counter and 0.0.0.0 destination next to the zero AS fields
+        record = bytes(8) + MATCHING_IPV4 + bytes(4) + bytes(8)
+        data = message(data_set(256, [record, record]))
+        
+        counts = Counter()
+        (out, positions), enriched = self.enricher._enrich_packet(data, EXPORTER, counts)
+        self.assertTrue(enriched)
+        self.assertIs(out, data)
+        self.assertEqual(list(positions), [FIRST_RECORD + 16, FIRST_RECORD + 20,
+                                           FIRST_RECORD + 40, FIRST_RECORD + 44])
+        self.assertEqual(counts['as_replaced'], 4)
+        
+    def test_enterprise_fields_shift_offsets_by_their_length(self):
+        # An enterprise-specific field carries a 4-byte enterprise number
+        # in the template, but only its own length in the record
+        fields = struct.pack('!HHI', 16 | IPFIX_ENTERPRISE_BIT, 4, 9) + struct.pack('!HH', 8, 4)
+        fields += struct.pack('!HH', 16, 4) + struct.pack('!HH', 17, 4)
+        body = struct.pack('!HH', 256, 4) + fields
+        self.enricher._parse_ipfix(message(struct.pack('!HH', 2, 4 + len(body)) + body), EXPORTER)
+        
+        # The enterprise field is not bgpSourceAsNumber despite its id
+        self.assertEqual(self.enricher._templates[(EXPORTER, 0, 256)], (16, (8, 12), ((4, 3),)))
+        
+        record = bytes(4) + MATCHING_IPV4 + bytes(8)
+        (_, positions), _ = self.enricher._enrich_packet(message(data_set(256, [record])), EXPORTER, Counter())
+        self.assertEqual(list(positions), [FIRST_RECORD + 8, FIRST_RECORD + 12])
+        
+    def test_variable_length_templates_are_not_rewritten(self):
+        # A variable-length field before the AS fields leaves no fixed
+        # offsets; the template after it in the same set is still learned
+        sets = template_set(256, [(8, 4), (82, 65535), (16, 4)])
+        sets += template_set(257, [(8, 4), (16, 4)])
+        self.enricher._parse_ipfix(message(sets), EXPORTER)
+        self.assertEqual(self.enricher._templates[(EXPORTER, 0, 256)][1:], ((), ()))
+        self.assertEqual(self.enricher._templates[(EXPORTER, 0, 257)], (8, (4,), ((0, 3),)))
+        
+        record = MATCHING_IPV4 + b'\x01a' + bytes(4)
+        data = message(data_set(256, [record]))
+        self.assertEqual(self.enricher._parse_ipfix(data, EXPORTER), [])
+        (_, positions), enriched = self.enricher._enrich_packet(data, EXPORTER, Counter())
+        self.assertFalse(enriched)
+        self.assertEqual(tuple(positions), ())
+        
+    def test_template_withdrawal_removes_cache_entry(self):
+        self.enricher._parse_ipfix(message(template_set(256, [(8, 4), (16, 4)])), EXPORTER)
+        self.assertIn((EXPORTER, 0, 256), self.enricher._templates)
+        
+        self.enricher._parse_ipfix(message(template_set(256, [])), EXPORTER)
+        self.assertNotIn((EXPORTER, 0, 256), self.enricher._templates)
+        
+        # Data for the withdrawn template is left alone
+        data = message(data_set(256, [MATCHING_IPV4 + bytes(4)]))
+        (_, positions), enriched = self.enricher._enrich_packet(data, EXPORTER, Counter())
+        self.assertFalse(enriched)
+        
+    def test_truncated_message_is_not_rewritten(self):
+        # Matching IPv4 prefix and an AS 0 run, but the header claims more
+        # bytes than the datagram holds
+        body = struct.pack('!HH', 256, 16) + bytes([185, 54, 81, 7]) + bytes(4) + bytes(4)
+        data = self._message(body, length=IPFIX_HEADER_LEN + len(body) + 100)
+        
+        self.assertEqual(self.enricher._parse_ipfix(data, EXPORTER), [])
+        
+        counts = Counter()
+        (out, positions), enriched = self.enricher._enrich_packet(data, EXPORTER, counts)
+        self.assertFalse(enriched)
+        self.assertIs(out, data)
+        self.assertEqual(tuple(positions), ())
+        self.assertEqual(counts['as_replaced'], 0)
+        
+    def test_non_ipfix_is_not_parsed(self):
+        data = struct.pack('!HHIII', 9, 40, 0, 0, 1) + bytes(24)
+        self.assertIsNone(self.enricher._parse_ipfix(data, EXPORTER))
+        
+    def test_exporters_sharing_template_id_do_not_collide(self):
+        # Same domain and template id, different record layouts:
+        # srcIPv4, dstIPv4, srcAS, dstAS for one exporter and
+        # packetDeltaCount first for the other
+        other = ('192.0.2.2', 4739)
+        layout_a = [(8, 4), (12, 4), (16, 4), (17, 4)]
+        layout_b = [(2, 8), (8, 4), (12, 4), (16, 4), (17, 4)]
+        self.enricher._parse_ipfix(message(template_set(256, layout_a)), EXPORTER)
+        self.enricher._parse_ipfix(message(template_set(256, layout_b)), other)
+        
+        record_a = MATCHING_IPV4 + OTHER_IPV4 + bytes(8)
+        record_b = bytes(8) + MATCHING_IPV4 + OTHER_IPV4 + bytes(8)
+        
+        counts = Counter()
+        (_, positions), _ = self.enricher._enrich_packet(message(data_set(256, [record_a])), EXPORTER, counts)
+        self.assertEqual(list(positions), [FIRST_RECORD + 8, FIRST_RECORD + 12])
+        
+        (_, positions), _ = self.enricher._enrich_packet(message(data_set(256, [record_b])), other, counts)
+        self.assertEqual(list(positions), [FIRST_RECORD + 16, FIRST_RECORD + 20])
+        
+    def test_only_matching_records_are_rewritten(self):
+        # srcIPv4, dstIPv4, srcAS, dstAS; one matching flow in the message
+        # must not pull the unrelated one along
+        self.enricher._parse_ipfix(message(template_set(256, [(8, 4), (12, 4), (16, 4), (17, 4)])), EXPORTER)
+        matching = OTHER_IPV4 + MATCHING_IPV4 + bytes(8)
+        unrelated = OTHER_IPV4 + OTHER_IPV4 + bytes(8)
+        data = message(data_set(256, [unrelated, matching, unrelated]))
+        
+        counts = Counter()
+        (_, positions), enriched = self.enricher._enrich_packet(data, EXPORTER, counts)
+        self.assertTrue(enriched)
+        self.assertEqual(list(positions), [FIRST_RECORD + 16 + 8, FIRST_RECORD + 16 + 12])
+        
+    def test_ipv6_record_is_matched_on_its_address(self):
+        # sourceIPv6Address, bgpDestinationAsNumber
+        self.enricher._parse_ipfix(message(template_set(256, [(27, 16), (17, 4)])), EXPORTER)
+        matching = bytes.fromhex('2a024460') + bytes(12) + bytes(4)
+        unrelated = bytes.fromhex('20010db8') + bytes(12) + bytes(4)
+        data = message(data_set(256, [matching, unrelated]))
+        
+        (_, positions), _ = self.enricher._enrich_packet(data, EXPORTER, Counter())
+        self.assertEqual(list(positions), [FIRST_RECORD + 16])
+        
+if __name__ == '__main__':
+    unittest.main()